@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Benchmark de Retrieval
+======================
+Mede memória, latência e recall@k dos modos de armazenamento do índice vetorial
+(float32, int8 e binário com rescoring) e da busca em dois estágios (páginas →
+chunks) contra a busca plana em precisão total
+"""
+
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from rich.console import Console
+from rich.table import Table
+
+from embedding_pipeline import BatchedEmbeddings, EmbeddingCache, EMBEDDING_MODEL
+from vector_index import NumpyVectorStore, QUANTIZATION_MODES, load_vector_store
+
+try:
+    from config import GOOGLE_API_KEY, RAG_CONFIG
+except ImportError:
+    import os
+    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+    RAG_CONFIG = {}
+
+console = Console()
+
+
+def create_embeddings() -> BatchedEmbeddings:
+    """Mesmo modelo de embeddings (e cache) do indexador e do chatbot"""
+    return BatchedEmbeddings(
+        GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GOOGLE_API_KEY),
+        cache=EmbeddingCache(RAG_CONFIG.get('embedding_cache_path', "embedding_cache.sqlite3"))
+    )
+
+
+def load_corpus(embeddings: BatchedEmbeddings, level: str = "chunk") -> Dict:
+    """Lê ids, textos, metadados e vetores do índice configurado (chunks ou páginas)"""
+    store = load_vector_store(RAG_CONFIG, embeddings, level=level)
+    data = store.get(include=['embeddings', 'documents', 'metadatas'])
+    data['embeddings'] = np.asarray(data['embeddings'], dtype=np.float32)
+    return data
+
+
+def build_store(directory: Path, corpus: Dict, quantization: str, batch_size: int = 2000) -> NumpyVectorStore:
+    """Cria um índice NumPy temporário com os mesmos vetores do índice real"""
+    store = NumpyVectorStore(persist_directory=str(directory), quantization=quantization)
+    ids, vectors = corpus['ids'], corpus['embeddings']
+    for i in range(0, len(ids), batch_size):
+        store.add_texts(
+            corpus['documents'][i:i + batch_size],
+            metadatas=corpus['metadatas'][i:i + batch_size],
+            ids=ids[i:i + batch_size],
+            embeddings=vectors[i:i + batch_size]
+        )
+    store.persist()
+    return store
+
+
+def search_ids(store: NumpyVectorStore, query: np.ndarray, k: int, exclude: str = None,
+               where: Dict = None) -> List[str]:
+    """Top-k chunk_ids de uma consulta (sem o próprio chunk, se for consulta do corpus)"""
+    found = store.similarity_search_by_vector_with_score(query, k=k + 1 if exclude else k, filter=where)
+    ids = [doc.metadata.get('chunk_id') for doc, _ in found]
+    return [chunk_id for chunk_id in ids if chunk_id != exclude][:k]
+
+
+def run_queries(store: NumpyVectorStore, queries: List[np.ndarray], k: int,
+                exclude: List[str] = None) -> Tuple[List[List[str]], float]:
+    """Top-k de cada consulta e latência média"""
+    results = []
+    start = time.perf_counter()
+    for i, query in enumerate(queries):
+        results.append(search_ids(store, query, k, exclude[i] if exclude else None))
+    elapsed = time.perf_counter() - start
+    return results, elapsed / max(1, len(queries))
+
+
+def recall_at_k(reference: List[List[str]], approximate: List[List[str]]) -> float:
+    """Fração média dos top-k exatos que aparecem nos top-k aproximados"""
+    scores = [
+        len(set(exact) & set(found)) / len(exact)
+        for exact, found in zip(reference, approximate) if exact
+    ]
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def build_queries(args, embeddings: BatchedEmbeddings, corpus: Dict) -> Tuple[List[np.ndarray], List[str]]:
+    """Consultas: perguntas reais (arquivo, uma por linha) ou chunks sorteados do próprio corpus
+    
+    Para chunks do corpus, devolve também os IDs a excluir do resultado (o próprio chunk).
+    """
+    if args.questions:
+        questions = [line.strip() for line in Path(args.questions).read_text(encoding="utf-8").splitlines()
+                     if line.strip()]
+        return [np.asarray(embeddings.embed_query(question), dtype=np.float32) for question in questions], None
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(range(len(corpus['ids'])), min(args.queries, len(corpus['ids'])))
+    return [corpus['embeddings'][i] for i in sample], [corpus['ids'][i] for i in sample]
+
+
+def load_chunk_corpus(embeddings: BatchedEmbeddings) -> Dict:
+    """Corpus de chunks do índice configurado (None se estiver vazio)"""
+    console.print("[cyan]📂 Carregando vetores do índice configurado...[/cyan]")
+    corpus = load_corpus(embeddings)
+    if not corpus['ids']:
+        console.print("[red]❌ Índice vazio! Execute o indexador primeiro.[/red]")
+        return None
+    console.print(f"[green]✅ {len(corpus['ids'])} vetores de dimensão {corpus['embeddings'].shape[1]}[/green]")
+    return corpus
+
+
+def benchmark_quantization(args):
+    """Compara float32 vs int8 vs binário (com diferentes tamanhos de rescoring)"""
+    embeddings = create_embeddings()
+    corpus = load_chunk_corpus(embeddings)
+    if corpus is None:
+        return
+
+    queries, exclude = build_queries(args, embeddings, corpus)
+    console.print(f"[cyan]🔎 {len(queries)} consultas, k={args.k}[/cyan]\n")
+
+    table = Table(title=f"Quantização — recall@{args.k} vs float32")
+    table.add_column("Modo", style="cyan")
+    table.add_column("Rescoring", justify="right")
+    table.add_column("RAM da busca", justify="right")
+    table.add_column("Redução", justify="right")
+    table.add_column("Latência (ms)", justify="right")
+    table.add_column(f"Recall@{args.k}", justify="right", style="green")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reference_store = build_store(Path(tmp) / "none", corpus, "none")
+        reference, latency = run_queries(reference_store, queries, args.k, exclude)
+        baseline_bytes = reference_store.memory_footprint()['hot']
+        table.add_row("float32", "-", f"{baseline_bytes / 1024 / 1024:.2f} MB", "1.0×",
+                      f"{latency * 1000:.2f}", "1.000")
+
+        for mode in QUANTIZATION_MODES[1:]:
+            store = build_store(Path(tmp) / mode, corpus, mode)
+            hot_bytes = store.memory_footprint()['hot']
+            for rescore in args.rescore:
+                store.rescore_candidates = rescore
+                found, latency = run_queries(store, queries, args.k, exclude)
+                table.add_row(
+                    mode, str(rescore), f"{hot_bytes / 1024 / 1024:.2f} MB",
+                    f"{baseline_bytes / max(1, hot_bytes):.1f}×",
+                    f"{latency * 1000:.2f}", f"{recall_at_k(reference, found):.3f}"
+                )
+
+    console.print(table)
+    console.print("\n[dim]RAM da busca = matriz float32 (sem quantização) ou códigos quantizados; "
+                  "os vetores completos ficam em disco (mmap) e só os candidatos são relidos.[/dim]")
+
+
+def benchmark_coarse(args):
+    """Recall@k da busca em dois estágios (top páginas → chunks) contra a busca plana"""
+    embeddings = create_embeddings()
+    corpus = load_chunk_corpus(embeddings)
+    if corpus is None:
+        return
+    pages = load_corpus(embeddings, level="page")
+    if not pages['ids']:
+        console.print("[red]❌ Coleção de páginas vazia! Reindexe com INDEXER_CONFIG['page_index'] = True.[/red]")
+        return
+    console.print(f"[green]✅ {len(pages['ids'])} páginas na coleção de páginas[/green]")
+
+    # Quantos chunks cada página tem (= candidatos da busca fina)
+    chunks_per_page = {}
+    for metadata in corpus['metadatas']:
+        key = metadata.get('page_key')
+        chunks_per_page[key] = chunks_per_page.get(key, 0) + 1
+
+    queries, exclude = build_queries(args, embeddings, corpus)
+    total = len(corpus['ids'])
+    console.print(f"[cyan]🔎 {len(queries)} consultas, k={args.k}[/cyan]\n")
+
+    table = Table(title=f"Busca em dois estágios — recall@{args.k} vs busca plana")
+    table.add_column("Páginas (estágio 1)", justify="right", style="cyan")
+    table.add_column("Chunks comparados", justify="right")
+    table.add_column("% do corpus", justify="right")
+    table.add_column("Latência (ms)", justify="right")
+    table.add_column(f"Recall@{args.k}", justify="right", style="green")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_store = build_store(Path(tmp) / "chunks", corpus, "none")
+        page_store = build_store(Path(tmp) / "pages", pages, "none")
+
+        reference, latency = run_queries(chunk_store, queries, args.k, exclude)
+        table.add_row("- (plana)", str(total), "100%", f"{latency * 1000:.2f}", "1.000")
+
+        for top_pages in args.pages:
+            found, candidates = [], 0
+            start = time.perf_counter()
+            for i, query in enumerate(queries):
+                page_keys = search_ids(page_store, query, top_pages)
+                candidates += sum(chunks_per_page.get(key, 0) for key in page_keys)
+                found.append(search_ids(chunk_store, query, args.k, exclude[i] if exclude else None,
+                                        where={'page_key': {'$in': page_keys}}))
+            latency = (time.perf_counter() - start) / max(1, len(queries))
+            average = candidates / max(1, len(queries))
+            table.add_row(
+                str(top_pages), f"{average:.0f}", f"{average / total:.0%}",
+                f"{latency * 1000:.2f}", f"{recall_at_k(reference, found):.3f}"
+            )
+
+    console.print(table)
+    console.print("\n[dim]Chunks comparados = chunks das páginas escolhidas no estágio 1. No índice NumPy "
+                  "o filtro por page_key usa o índice invertido e só esses chunks são pontuados (o custo da "
+                  "busca fina cresce com eles, não com o corpus); no Chroma o filtro não reduz a busca "
+                  "HNSW: é uma consulta a mais e o recall só pode cair em relação à busca plana.[/dim]")
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Benchmarks de retrieval do índice vetorial")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    quantization = subparsers.add_parser("quantization", help="Memória e recall@k do índice quantizado")
+    quantization.add_argument("-k", type=int, default=10, help="Tamanho do top-k comparado")
+    quantization.add_argument("--queries", type=int, default=200,
+                              help="Chunks do corpus usados como consulta (sem arquivo de perguntas)")
+    quantization.add_argument("--questions", help="Arquivo com uma pergunta por linha")
+    quantization.add_argument("--rescore", type=int, nargs="+", default=[50, 200, 1000],
+                              help="Quantidades de candidatos reordenados em float32")
+    quantization.add_argument("--seed", type=int, default=42)
+    quantization.set_defaults(func=benchmark_quantization)
+
+    coarse = subparsers.add_parser("coarse", help="Recall@k da busca em dois estágios (páginas → chunks)")
+    coarse.add_argument("-k", type=int, default=10, help="Tamanho do top-k comparado")
+    coarse.add_argument("--queries", type=int, default=200,
+                        help="Chunks do corpus usados como consulta (sem arquivo de perguntas)")
+    coarse.add_argument("--questions", help="Arquivo com uma pergunta por linha")
+    coarse.add_argument("--pages", type=int, nargs="+", default=[5, 10, 20, 40],
+                        help="Quantidades de páginas selecionadas no estágio grosso")
+    coarse.add_argument("--seed", type=int, default=42)
+    coarse.set_defaults(func=benchmark_coarse)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Índice Lexical BM25
+===================
+Índice invertido persistente (JSON) construído junto com o banco vetorial, para
+casar identificadores exatos (zeebe:taskDefinition, JavaDelegate, flags de CLI)
+que a busca densa recupera mal. Os rankings lexical e denso são combinados com
+Reciprocal Rank Fusion (RRF)
+"""
+
+import os
+import re
+import json
+import math
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+INDEX_VERSION = 1
+
+# Tokens "técnicos" inteiros: flags (--batch-size), prefixos XML (zeebe:taskDefinition),
+# pacotes (io.camunda.zeebe) e caminhos; palavras simples caem no último ramo
+_TOKEN_RE = re.compile(r"--?[A-Za-z0-9][\w.-]*|[\w][\w.:/-]*[\w]|\w")
+_SPLIT_RE = re.compile(r"[.:/_-]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Palavras muito frequentes (português e inglês) que só diluem o score
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "de", "da", "do", "das", "dos", "em", "no", "na", "nos", "nas",
+    "por", "para", "com", "sem", "que", "e", "ou", "se", "como", "qual", "quais", "quando", "onde",
+    "ao", "aos", "é", "ser", "são", "mais", "meu", "minha", "eu", "isso", "esse", "essa", "este", "esta",
+    "the", "an", "of", "to", "in", "on", "for", "with", "and", "or", "is", "are", "be", "by", "it",
+    "this", "that", "as", "at", "from", "how", "what", "which", "can", "do", "does", "i", "you",
+}
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens do BM25: o identificador inteiro e também suas partes
+
+    "zeebe:taskDefinition" → zeebe:taskdefinition, zeebe, taskdefinition, task, definition
+    """
+    tokens = []
+    for raw in _TOKEN_RE.findall(_strip_accents(text)):
+        token = raw.lower()
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+
+        # Partes de identificadores compostos (separadores e camelCase)
+        parts = [part for part in _SPLIT_RE.split(raw) if part]
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if part.lower() not in STOPWORDS)
+        for part in parts:
+            camel = _CAMEL_RE.findall(part)
+            if len(camel) > 1:
+                tokens.extend(piece.lower() for piece in camel)
+    return tokens
+
+
+class BM25Index:
+    """Índice invertido BM25 (Okapi) sobre os chunks do banco vetorial"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, chunk_id: str, text: str):
+        """Adiciona um chunk ao índice"""
+        tokens = tokenize(text)
+        doc = len(self.ids)
+        self.ids.append(chunk_id)
+        self.lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, {})[doc] = tf
+
+    def search(self, query: str, k: int = 50, allowed_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k chunks por score BM25 (opcionalmente restrito a um conjunto de IDs)"""
+        if not self.ids:
+            return []
+        total = len(self.ids)
+        avg_length = sum(self.lengths) / total or 1.0
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc, score in ranked:
+            if allowed_ids is not None and self.ids[doc] not in allowed_ids:
+                continue
+            results.append((self.ids[doc], score))
+            if len(results) >= k:
+                break
+        return results
+
+    def save(self, path: str):
+        """Salva o índice de forma atômica"""
+        path = Path(path)
+        data = {
+            'version': INDEX_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'ids': self.ids,
+            'lengths': self.lengths,
+            # JSON não tem chaves inteiras: postings como listas [doc, tf]
+            'postings': {term: [[doc, tf] for doc, tf in docs.items()] for term, docs in self.postings.items()},
+        }
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Carrega o índice; None se não existir ou for de outra versão"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            return None
+        index = cls(k1=data['k1'], b=data['b'])
+        index.ids = data['ids']
+        index.lengths = data['lengths']
+        index.postings = {term: {doc: tf for doc, tf in docs} for term, docs in data['postings'].items()}
+        return index
+
+    @classmethod
+    def from_vector_store(cls, vectorstore, page_size: int = 5000, **kwargs) -> "BM25Index":
+        """Constrói o índice a partir de todos os chunks do banco vetorial (Chroma ou NumPy)"""
+        index = cls(**kwargs)
+        offset = 0
+        while True:
+            page = vectorstore.get(limit=page_size, offset=offset, include=['documents', 'metadatas'])
+            for store_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                # Chaveado pelo chunk_id do metadata (índices antigos do Chroma usam UUIDs como ID)
+                index.add((metadata or {}).get('chunk_id') or store_id, text or "")
+            if len(page['ids']) < page_size:
+                return index
+            offset += page_size
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Combina rankings (listas de IDs, melhor primeiro): score = Σ 1 / (k + posição)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
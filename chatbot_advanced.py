@@ -7,15 +7,29 @@ Retrieval (Top-K 100) + Reranker Cohere (Top-10) + Suporte a Imagens
 
 import os
 import json
+import hashlib
+import threading
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
+import numpy as np
 import streamlit as st
 import google.generativeai as genai
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 import cohere
 
+from embedding_pipeline import BatchedEmbeddings, EmbeddingCache, EMBEDDING_MODEL
+from rag_cache import LRUCache, SemanticAnswerCache, normalize_query
+from index_snapshot import file_sha256
+from vector_index import NumpyVectorStore, load_vector_store, vector_store_path
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from query_filters import build_where, combine_where, infer_filters
+from dedup import load_references
+from chunk_graph import ChunkGraph
+from parent_store import ParentStore
+from rerankers import AdaptiveRerankPolicy, LexicalReranker, create_reranker
+
 # Importa Groq (opcional)
 try:
     from groq import Groq
@@ -96,7 +110,12 @@ st.markdown("""
 
 
 class AdvancedRAGChatbot:
-    """Chatbot com RAG avançado: Retrieval + Reranking + Imagens"""
+    """Chatbot com RAG avançado: Retrieval + Reranking + Imagens
+    
+    Uma instância por processo, compartilhada por todas as sessões do Streamlit
+    (ver `get_chatbot_engine`): depois de carregada só é lida, exceto pelo fallback
+    do LLM, protegido por lock. O histórico da conversa fica na sessão.
+    """
     
     def __init__(self, google_api_key: str, cohere_api_key: str = None, groq_api_key: str = None):
         self.google_api_key = google_api_key
@@ -106,25 +125,78 @@ class AdvancedRAGChatbot:
         # Detecta provider
         self.llm_provider = LLM_PROVIDER
         
-        # Inicializa componentes
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=google_api_key
+        # Avisos do carregamento (exibidos pela interface; o engine não desenha nada ao subir)
+        self.load_warnings: List[str] = []
+        self._llm_lock = threading.Lock()
+        
+        # Inicializa componentes: embeddings das perguntas com LRU em memória e, opcionalmente,
+        # cache persistente (SQLite, compartilhado com o indexador) que sobrevive a reinícios
+        embedding_cache_path = RAG_CONFIG.get('embedding_cache_path', "embedding_cache.sqlite3")
+        self.embeddings = BatchedEmbeddings(
+            GoogleGenerativeAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                google_api_key=google_api_key
+            ),
+            cache=EmbeddingCache(embedding_cache_path) if embedding_cache_path else None,
+            query_cache=LRUCache(RAG_CONFIG.get('query_embedding_cache_size', 1024))
         )
         
+        # Respostas de perguntas equivalentes (invalidadas quando o índice muda)
+        if RAG_CONFIG.get('answer_cache', False):
+            self.answer_cache = SemanticAnswerCache(
+                threshold=RAG_CONFIG.get('answer_cache_threshold', 0.95),
+                ttl_seconds=RAG_CONFIG.get('answer_cache_ttl', 3600),
+                max_size=RAG_CONFIG.get('answer_cache_size', 500)
+            )
+        else:
+            self.answer_cache = None
+        self.stale_lexical_hits = 0
+        
         # Carrega vectorstore
         self.vectorstore = None
         self.load_vectorstore()
         
+        # Índice lexical (BM25) para a busca híbrida; sem ele, só busca vetorial
+        self.bm25_index = self.load_lexical_index()
+        
+        # Coleção de páginas para a busca em dois estágios (páginas → chunks)
+        self.page_vectorstore = self.load_page_vectorstore()
+        
         # Inicializa Cohere para reranking
         if self.cohere_api_key:
-            self.cohere_client = cohere.Client(self.cohere_api_key)
+            self.cohere_client = cohere.Client(self.cohere_api_key, timeout=RAG_CONFIG.get('rerank_timeout', 10))
         else:
             self.cohere_client = None
         
+        # Reranker plugável (Cohere, lexical ou ONNX local), com fallback local se o remoto falhar,
+        # política adaptativa (pula quando há vencedor claro) e resultados em LRU
+        self.reranker = self.load_reranker()
+        self.fallback_reranker = LexicalReranker(RAG_CONFIG.get('rrf_k', 60))
+        self.rerank_policy = AdaptiveRerankPolicy(
+            margin=RAG_CONFIG.get('rerank_skip_margin', 0),
+            min_candidates=RAG_CONFIG.get('rerank_skip_min_candidates', 3)
+        )
+        self.rerank_cache = LRUCache(RAG_CONFIG.get('rerank_cache_size', 256))
+        
+        # chunk_ids por filtro de metadata (restringem o BM25 sem varrer o banco a cada pergunta)
+        self.filter_ids_cache = LRUCache(64)
+        
         # Carrega metadata de imagens
         self.image_metadata = self.load_image_metadata()
         
+        # Texto das páginas: os chunks recuperados são expandidos para trechos da página no prompt
+        self.parent_store = self.load_parent_store()
+        
+        # Vizinhos pré-calculados dos chunks (contexto ampliado sem novas buscas)
+        self.chunk_graph = self.load_chunk_graph()
+        
+        # Outras ocorrências de chunks colapsados na deduplicação (citadas nas fontes)
+        try:
+            self.duplicate_references = load_references(RAG_CONFIG.get('dedup_index_path', "dedup_index.json"))
+        except Exception as e:
+            self.load_warnings.append(f"⚠️ Não foi possível carregar as referências de duplicatas: {e}")
+            self.duplicate_references = {}
+        
         # Inicializa LLM baseado no provider
         if self.llm_provider == "groq":
             if not GROQ_AVAILABLE:
@@ -142,18 +214,43 @@ class AdvancedRAGChatbot:
             )
     
     def load_vectorstore(self):
-        """Carrega o banco vetorial"""
+        """Carrega o banco vetorial (Chroma ou índice NumPy, conforme RAG_CONFIG['vector_backend'])"""
         try:
-            self.vectorstore = Chroma(
-                persist_directory="./chroma_db",
-                embedding_function=self.embeddings,
-                collection_name="camunda_migration"
-            )
+            self.vectorstore = load_vector_store(RAG_CONFIG, self.embeddings)
             return True
         except Exception as e:
-            st.error(f"❌ Erro ao carregar vectorstore: {e}")
+            self.load_warnings.append(f"❌ Erro ao carregar vectorstore: {e}")
             return False
     
+    def load_page_vectorstore(self):
+        """Abre a coleção de páginas (None se a busca em dois estágios estiver desligada ou vazia)"""
+        if not RAG_CONFIG.get('coarse_to_fine', False):
+            return None
+        try:
+            store = load_vector_store(RAG_CONFIG, self.embeddings, level="page")
+            return store if store.get(limit=1, include=[])['ids'] else None
+        except Exception as e:
+            self.load_warnings.append(f"⚠️ Não foi possível carregar a coleção de páginas: {e}")
+            return None
+    
+    def load_lexical_index(self):
+        """Carrega o índice BM25 gerado pelo indexador (None se a busca híbrida estiver desligada)"""
+        if not RAG_CONFIG.get('hybrid_search', True):
+            return None
+        try:
+            return BM25Index.load(RAG_CONFIG.get('bm25_index_path', "bm25_index.json"))
+        except Exception as e:
+            self.load_warnings.append(f"⚠️ Não foi possível carregar o índice BM25: {e}")
+            return None
+    
+    def load_reranker(self):
+        """Cria o reranker de RAG_CONFIG['reranker'] (padrão: Cohere; local sem COHERE_API_KEY)"""
+        try:
+            return create_reranker(RAG_CONFIG.get('reranker', "cohere"), self.cohere_client, RAG_CONFIG)
+        except Exception as e:
+            self.load_warnings.append(f"⚠️ Não foi possível carregar o reranker ({e}); usando o lexical")
+            return LexicalReranker(RAG_CONFIG.get('rrf_k', 60))
+    
     def load_image_metadata(self) -> Dict:
         """Carrega metadata de imagens"""
         try:
@@ -161,9 +258,59 @@ class AdvancedRAGChatbot:
                 with open("image_metadata.json", "r") as f:
                     return json.load(f)
         except Exception as e:
-            st.warning(f"⚠️ Não foi possível carregar metadata de imagens: {e}")
+            self.load_warnings.append(f"⚠️ Não foi possível carregar metadata de imagens: {e}")
         return {}
     
+    def load_chunk_graph(self):
+        """Carrega o grafo de vizinhança gerado pelo indexador (None se não existir)"""
+        try:
+            return ChunkGraph.load(RAG_CONFIG.get('chunk_graph_path', "chunk_graph.json"))
+        except Exception as e:
+            self.load_warnings.append(f"⚠️ Não foi possível carregar o grafo de vizinhança: {e}")
+            return None
+    
+    def load_parent_store(self) -> Optional[ParentStore]:
+        """Abre o parent store (texto das páginas) gerado pelo indexador; lido sob demanda"""
+        try:
+            path = Path(RAG_CONFIG.get('parent_store_path', "parent_store.sqlite3"))
+            if path.exists():
+                return ParentStore(str(path))
+        except Exception as e:
+            self.load_warnings.append(f"⚠️ Não foi possível abrir o texto das páginas: {e}")
+        return None
+    
+    def index_version(self) -> str:
+        """Versão atual do índice (ver `current_index_version`)"""
+        return current_index_version()
+    
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Contadores de acerto dos caches do engine"""
+        stats = {'query_embeddings': self.embeddings.query_cache_stats()}
+        if self.answer_cache is not None:
+            stats['answers'] = self.answer_cache.stats()
+        stats['rerank'] = {**self.rerank_cache.stats(), **self.rerank_policy.stats()}
+        return stats
+    
+    def group_images_by_document(self, image_paths: List[str]) -> Dict[str, List[str]]:
+        """Agrupa imagens existentes em disco pelo documento de origem"""
+        images_by_doc = {}
+        for img_path in image_paths:
+            if not Path(img_path).exists():
+                continue
+            
+            # Store endereçado por conteúdo: documento vem do metadata
+            info = self.image_metadata.get(Path(img_path).name)
+            if info:
+                doc_name = info['document']
+            else:
+                # Formato antigo: documento_pX_imgY.png
+                parts = Path(img_path).stem.split('_p')
+                doc_name = parts[0] if parts else "Documento"
+            
+            images_by_doc.setdefault(doc_name, []).append(img_path)
+        
+        return images_by_doc
+    
     def get_system_prompt(self) -> str:
         """Retorna o system prompt otimizado"""
         return """Você é um assistente especializado em migração Camunda 7→8.
@@ -206,72 +353,286 @@ Responda APENAS com informação dos chunks. Seja ULTRA conciso:"""
                 )
                 return completion.choices[0].message.content
             except Exception as e:
-                # Fallback silencioso para Gemini
-                if not hasattr(self, 'model'):
-                    genai.configure(api_key=self.google_api_key)
-                    self.model = genai.GenerativeModel(
-                        model_name="gemini-2.5-pro",
-                        generation_config=GENERATION_CONFIG
-                    )
+                # Fallback silencioso para Gemini (criado uma vez, mesmo com sessões concorrentes)
+                with self._llm_lock:
+                    if not hasattr(self, 'model'):
+                        genai.configure(api_key=self.google_api_key)
+                        self.model = genai.GenerativeModel(
+                            model_name="gemini-2.5-pro",
+                            generation_config=GENERATION_CONFIG
+                        )
                 response = self.model.generate_content(prompt)
                 return response.text
         else:  # gemini
             response = self.model.generate_content(prompt)
             return response.text
     
-    def retrieve_documents(self, query: str, k: int = 100) -> List[Tuple]:
-        """Retrieval: busca top-K documentos similares"""
+    def retrieve_documents(self, query: str, k: int = 100, where: Dict = None,
+                           boost_where: Dict = None) -> List[Tuple]:
+        """Retrieval: busca top-K documentos similares (vetorial, ou híbrida BM25 + vetorial com RRF)
+        
+        `where` (filtro de metadata) é aplicado dentro do banco vetorial e também ao BM25.
+        Com a coleção de páginas, a busca densa fica restrita aos chunks das páginas mais
+        próximas da pergunta (o BM25 continua vendo todo o corpus).
+        `boost_where` (roteamento inferido da pergunta) não filtra: uma busca densa extra
+        restrita a ele entra como mais um ranking no RRF, promovendo esses chunks.
+        """
         if not self.vectorstore:
             return []
         
         try:
-            # Busca com similaridade
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            return results
+            # Embedding da pergunta calculado uma vez para os dois estágios
+            query_vector = self.embeddings.embed_query(query)
+            
+            # Estágio grosso: páginas mais similares
+            dense_where = where
+            if self.page_vectorstore is not None:
+                pages = self.page_vectorstore.similarity_search_by_vector_with_relevance_scores(
+                    query_vector, k=RAG_CONFIG.get('coarse_top_pages', 20), filter=where
+                )
+                page_keys = [doc.metadata['page_key'] for doc, _ in pages]
+                if page_keys:
+                    # No índice NumPy só os chunks dessas páginas são pontuados; no Chroma o
+                    # filtro não encurta a busca HNSW: só custa uma consulta a mais e perde recall
+                    dense_where = combine_where(where, {'page_key': {'$in': page_keys}})
+            
+            # Busca com similaridade (retorna distâncias: menor = mais similar)
+            results = self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+                query_vector, k=k, filter=dense_where
+            )
+            dense_rankings = [results]
+            if boost_where:
+                dense_rankings.append(self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+                    query_vector, k=k, filter=combine_where(where, boost_where)
+                ))
+            if self.bm25_index is None and len(dense_rankings) == 1:
+                return results
+            
+            lexical = []
+            if self.bm25_index is not None:
+                allowed_ids = self.filter_chunk_ids(where) if where else None
+                lexical = self.bm25_index.search(query, k=RAG_CONFIG.get('bm25_top_k', k), allowed_ids=allowed_ids)
+            return self.fuse_results(dense_rankings, lexical, k, query_vector)
         except Exception as e:
             st.error(f"❌ Erro no retrieval: {e}")
             return []
     
-    def rerank_documents(self, query: str, documents: List, top_n: int = 10) -> List:
-        """Reranking: reordena documentos por relevância usando Cohere"""
-        if not self.cohere_client:
-            # Retorna no formato correto (doc, score, relevance) mesmo sem reranking
-            return [(doc, score, score) for doc, score in documents[:top_n]]
+    def filter_chunk_ids(self, where: Dict) -> set:
+        """chunk_ids que satisfazem o filtro (restringe o ranking lexical)
         
-        try:
-            # Prepara documentos para reranking
-            docs_text = [doc[0].page_content for doc in documents]
-            
-            # Rerank com Cohere
-            reranked = self.cohere_client.rerank(
-                query=query,
-                documents=docs_text,
-                top_n=top_n,
-                model="rerank-multilingual-v3.0"
-            )
-            
-            # Reordena documentos originais
-            reranked_docs = []
-            for result in reranked.results:
-                original_doc = documents[result.index]
-                reranked_docs.append((
-                    original_doc[0],
-                    original_doc[1],
-                    result.relevance_score
-                ))
+        Cacheado por filtro: o banco só é varrido na primeira pergunta com cada filtro.
+        """
+        key = json.dumps(where, sort_keys=True)
+        chunk_ids = self.filter_ids_cache.get(key)
+        if chunk_ids is None:
+            found = self.vectorstore.get(where=where, include=['metadatas'])
+            chunk_ids = frozenset(metadata.get('chunk_id') for metadata in found['metadatas'])
+            self.filter_ids_cache.put(key, chunk_ids)
+        return chunk_ids
+    
+    def fuse_results(self, dense_rankings: List[List[Tuple]], lexical: List[Tuple[str, float]], k: int,
+                     query_vector: List[float]) -> List[Tuple]:
+        """Funde os rankings densos (busca principal e, se houver, a do roteamento) e o
+        lexical com RRF
+        
+        A ordem é a do RRF, mas a tupla mantém o contrato (doc, distância densa): o score
+        RRF vai em doc.metadata['rrf_score']. Chunks que só o BM25 encontrou recebem a
+        distância L2² calculada com o vetor armazenado, como o banco calcularia (o índice
+        NumPy normaliza os vetores; o Chroma usa os vetores como estão). IDs do BM25 que
+        não estão mais no banco são contados em `stale_lexical_hits` e substituídos pelos
+        próximos da fusão, então o resultado continua com k chunks.
+        """
+        docs_by_id = {}
+        distances = {}
+        for dense in dense_rankings:
+            for doc, distance in dense:
+                docs_by_id[doc.metadata.get('chunk_id')] = doc
+                distances[doc.metadata.get('chunk_id')] = distance
+        rankings = [[doc.metadata.get('chunk_id') for doc, _ in dense] for dense in dense_rankings]
+        if lexical:
+            rankings.append([chunk_id for chunk_id, _ in lexical])
+        fused = reciprocal_rank_fusion(rankings, k=RAG_CONFIG.get('rrf_k', 60))
+        
+        query = np.asarray(query_vector, dtype=np.float32)
+        if isinstance(self.vectorstore, NumpyVectorStore):
+            query = query / (np.linalg.norm(query) or 1.0)
+        
+        results = []
+        position = 0
+        while len(results) < k and position < len(fused):
+            batch = fused[position:position + k - len(results)]
+            position += len(batch)
             
-            return reranked_docs
+            # Chunks que só o BM25 encontrou: busca texto, metadata e vetor no banco pelo chunk_id
+            missing = [chunk_id for chunk_id, _ in batch if chunk_id not in docs_by_id]
+            if missing:
+                found = self.vectorstore.get(where={'chunk_id': {'$in': missing}},
+                                             include=['documents', 'metadatas', 'embeddings'])
+                for text, metadata, vector in zip(found['documents'], found['metadatas'], found['embeddings']):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    docs_by_id[metadata['chunk_id']] = Document(page_content=text, metadata=metadata)
+                    distances[metadata['chunk_id']] = float(np.sum((query - vector) ** 2))
             
+            for chunk_id, score in batch:
+                if chunk_id not in docs_by_id:
+                    # BM25 à frente do banco (reindexação em andamento): o próximo da fila entra no lugar
+                    self.stale_lexical_hits += 1
+                    continue
+                # Metadata copiado: o dict pode ser o mesmo guardado no banco (índice NumPy)
+                results.append((Document(page_content=docs_by_id[chunk_id].page_content,
+                                         metadata={**docs_by_id[chunk_id].metadata, 'rrf_score': score}),
+                                distances[chunk_id]))
+        return results
+    
+    def rerank_documents(self, query: str, documents: List, top_n: int = 10) -> List:
+        """Reranking: reordena documentos por relevância com o reranker configurado
+        
+        Devolve sempre (doc, score, relevance). Sem reranker, ou quando o retrieval já tem
+        um vencedor claro, mantém a ordem do retrieval e a relevância é a similaridade densa.
+        Se o reranker remoto falhar, usa o lexical local.
+        """
+        # A política olha a similaridade densa, não o score RRF (que só reflete posições)
+        similarities = [self.dense_similarity(score) for _, score in documents]
+        if self.reranker is None or self.rerank_policy.should_skip(similarities):
+            return [(doc, score, similarity) for (doc, score), similarity in zip(documents[:top_n], similarities)]
+        
+        try:
+            ranking = self._rerank_cached(self.reranker, query, documents, top_n)
         except Exception as e:
-            st.error(f"❌ Erro no reranking: {e}")
-            return documents[:top_n]
+            if self.reranker is self.fallback_reranker:
+                st.error(f"❌ Erro no reranking: {e}")
+                return [(doc, score, self.dense_similarity(score)) for doc, score in documents[:top_n]]
+            st.warning(f"⚠️ Reranker {self.reranker.name} indisponível ({e}); usando o reranker local")
+            ranking = self._rerank_cached(self.fallback_reranker, query, documents, top_n)
+        
+        # Reordena documentos originais
+        return [(documents[index][0], documents[index][1], relevance) for index, relevance in ranking]
+    
+    @staticmethod
+    def dense_similarity(distance: float) -> float:
+        """Cosseno a partir da distância L2² do retrieval (d = 2 − 2·cos, vetores normalizados)"""
+        return 1.0 - distance / 2.0
+    
+    def _rerank_cached(self, reranker, query: str, documents: List, top_n: int) -> List[Tuple[int, float]]:
+        """Ranking [(índice, relevância)]; mesma pergunta com os mesmos candidatos (na mesma
+        ordem) reusa o resultado anterior"""
+        cache_key = (
+            normalize_query(query),
+            tuple(doc.metadata.get('chunk_id') for doc, _ in documents),
+            reranker.name,
+            top_n
+        )
+        ranking = self.rerank_cache.get(cache_key)
+        if ranking is None:
+            ranking = reranker.rerank(query, [doc.page_content for doc, _ in documents], top_n)
+            self.rerank_cache.put(cache_key, ranking)
+        return ranking
+    
+    def expand_with_neighbors(self, reranked_docs: List) -> List:
+        """Acrescenta, logo após os melhores chunks, seus vizinhos no grafo (anterior/próximo
+        e, se configurado, os mais similares). Só consulta o grafo e busca os textos por ID:
+        nenhum embedding nem busca vetorial extra."""
+        if self.chunk_graph is None:
+            return reranked_docs
+        
+        top = RAG_CONFIG.get('neighbor_expansion_top', 3)
+        similar_n = RAG_CONFIG.get('similar_expansion', 0)
+        present = {doc.metadata.get('chunk_id') for doc, _, _ in reranked_docs}
+        neighbors_by_rank = {}
+        for rank, (doc, _, _) in enumerate(reranked_docs[:top]):
+            chunk_id = doc.metadata.get('chunk_id')
+            neighbors = self.chunk_graph.adjacent(chunk_id)
+            if similar_n:
+                neighbors += [neighbor for neighbor, _ in self.chunk_graph.similar(chunk_id, similar_n)]
+            neighbors_by_rank[rank] = [neighbor for neighbor in neighbors if neighbor not in present]
+            present.update(neighbors_by_rank[rank])
+        
+        wanted = [neighbor for neighbors in neighbors_by_rank.values() for neighbor in neighbors]
+        if not wanted:
+            return reranked_docs
+        found = self.vectorstore.get(where={'chunk_id': {'$in': wanted}}, include=['documents', 'metadatas'])
+        docs_by_id = {
+            metadata['chunk_id']: Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(found['documents'], found['metadatas'])
+        }
+        
+        # Vizinhos herdam score e relevância do chunk que os trouxe
+        expanded = []
+        for rank, (doc, score, relevance) in enumerate(reranked_docs):
+            expanded.append((doc, score, relevance))
+            expanded.extend(
+                (docs_by_id[neighbor], score, relevance)
+                for neighbor in neighbors_by_rank.get(rank, []) if neighbor in docs_by_id
+            )
+        return expanded
+    
+    def expand_to_parent_spans(self, reranked_docs: List) -> List[Tuple[Document, float, str]]:
+        """Expande cada chunk (filho) para um trecho da sua página e une os trechos que se sobrepõem
+        
+        Chunks vizinhos da mesma página viram um único trecho, então o texto em overlap
+        vai uma vez só para o LLM. Chunks sem página no parent store (índices antigos)
+        seguem como estão. Retorna (doc, relevância, texto) na ordem do melhor chunk de cada trecho.
+        """
+        padding = RAG_CONFIG.get('parent_context_chars', 300)
+        spans_by_page = {}
+        standalone = []
+        page_texts = (self.parent_store.get_many(doc.metadata.get('page_key') for doc, _, _ in reranked_docs)
+                      if self.parent_store is not None else {})
+        
+        for rank, (doc, score, relevance) in enumerate(reranked_docs):
+            page_text = page_texts.get(doc.metadata.get('page_key'))
+            start = doc.metadata.get('start_index')
+            if page_text is None or start is None or start < 0:
+                standalone.append((rank, doc, relevance, doc.page_content))
+                continue
+            spans_by_page.setdefault(doc.metadata['page_key'], []).append({
+                'begin': max(0, start - padding),
+                'end': min(len(page_text), start + len(doc.page_content) + padding),
+                'rank': rank, 'doc': doc, 'relevance': relevance, 'docs': [doc],
+            })
+        
+        merged = []
+        for page_key, spans in spans_by_page.items():
+            page_text = page_texts[page_key]
+            spans.sort(key=lambda span: span['begin'])
+            current = spans[0]
+            for span in spans[1:]:
+                if span['begin'] <= current['end']:
+                    current['end'] = max(current['end'], span['end'])
+                    current['docs'].extend(span['docs'])
+                    if span['rank'] < current['rank']:
+                        current.update(rank=span['rank'], doc=span['doc'])
+                    current['relevance'] = max(current['relevance'], span['relevance'])
+                else:
+                    merged.append(current)
+                    current = span
+            merged.append(current)
+        
+        results = [
+            (span['rank'], self._merge_span_metadata(span['doc'], span['docs']), span['relevance'],
+             page_texts[span['doc'].metadata['page_key']][span['begin']:span['end']].strip())
+            for span in merged
+        ] + standalone
+        results.sort(key=lambda item: item[0])
+        return [(doc, relevance, text) for _, doc, relevance, text in results]
+    
+    @staticmethod
+    def _merge_span_metadata(doc: Document, docs: List[Document]) -> Document:
+        """Metadata do trecho: a do melhor chunk, com as imagens de todos os chunks unidos"""
+        if len(docs) == 1:
+            return doc
+        images = []
+        for chunk in docs:
+            images.extend(img for img in json.loads(chunk.metadata.get('images', '[]')) if img not in images)
+        metadata = {**doc.metadata, 'images': json.dumps(images), 'has_images': bool(images)}
+        return Document(page_content=doc.page_content, metadata=metadata)
     
     def format_chunks_for_prompt(self, reranked_docs: List) -> Tuple[str, List]:
-        """Formata chunks para o prompt, incluindo informações de imagens"""
+        """Formata chunks para o prompt (expandidos para trechos da página), incluindo informações de imagens"""
         chunks_text = []
         images_info = []
         
-        for i, (doc, score, relevance) in enumerate(reranked_docs, 1):
+        for i, (doc, relevance, content) in enumerate(self.expand_to_parent_spans(reranked_docs), 1):
             chunk_text = f"""
 ---
 CHUNK {i} (Relevância: {relevance:.2f})
@@ -287,35 +648,64 @@ Seção: {doc.metadata.get('section', 'general')}
                 chunk_text += f"⚠️ ESTE CHUNK CONTÉM IMAGENS RELEVANTES\n"
                 chunk_text += f"Imagens: {', '.join([Path(img).name for img in images_list])}\n"
                 
-                # Adiciona à lista de imagens para potencial exibição
-                images_info.extend(images_list)
+                # Adiciona à lista de imagens para potencial exibição (sem repetir a mesma imagem)
+                images_info.extend(img for img in images_list if img not in images_info)
             
-            chunk_text += f"\nCONTEÚDO:\n{doc.page_content}\n"
+            chunk_text += f"\nCONTEÚDO:\n{content}\n"
             chunks_text.append(chunk_text)
         
         return "\n".join(chunks_text), images_info
     
-    def ask(self, question: str) -> Dict:
-        """Faz uma pergunta com RAG completo"""
+    def ask(self, question: str, filters: Dict = None) -> Dict:
+        """Faz uma pergunta com RAG completo
+        
+        `filters` restringe a busca: {'documents': [...], 'section': ..., 'has_images': bool}.
+        Sem filtros explícitos, o documento alvo inferido da pergunta (RAG_CONFIG['auto_filters'])
+        só é priorizado na fusão: uma inferência errada não tira nada do recall.
+        """
+        
+        # 0. CACHE DE RESPOSTAS: pergunta equivalente já respondida com o índice atual
+        question_vector = None
+        if self.answer_cache is not None:
+            index_version = self.index_version()
+            self.answer_cache.set_version(index_version)
+            scope = json.dumps(filters, sort_keys=True) if filters is not None else None
+            try:
+                question_vector = self.embeddings.embed_query(question)
+            except Exception:
+                question_vector = None  # O retrieval mostra o erro
+            if question_vector is not None:
+                cached = self.answer_cache.lookup(question_vector, scope)
+                if cached is not None:
+                    return {**cached, 'cached': True}
+        
+        # 0. FILTROS DE METADATA (explícitos) E ROTEAMENTO (inferido da pergunta, só prioriza)
+        where = build_where(**(filters or {}))
+        routing = {}
+        if filters is None and RAG_CONFIG.get('auto_filters', True):
+            routing = infer_filters(question, RAG_CONFIG.get('document_routes'))
+        boost_where = build_where(**routing)
         
         # 1. RETRIEVAL (Top-K configurável)
         retrieval_k = RAG_CONFIG.get('retrieval_top_k', 100)
         with st.spinner("🤖 Processando sua pergunta..."):
-            retrieved_docs = self.retrieve_documents(question, k=retrieval_k)
+            retrieved_docs = self.retrieve_documents(question, k=retrieval_k, where=where, boost_where=boost_where)
         
             if not retrieved_docs:
                 return {
                     'answer': "❌ Não foi possível recuperar documentos. Verifique se a indexação foi executada.",
                     'images': [],
-                    'sources': []
+                    'sources': [],
+                    'filters': filters or {},
+                    'routing': routing
                 }
             
             # 2. RERANKING (Top-N configurável)
             rerank_n = RAG_CONFIG.get('rerank_top_n', 10)
             reranked_docs = self.rerank_documents(question, retrieved_docs, top_n=rerank_n)
         
-        # 3. FORMATA CHUNKS
-        chunks_formatted, images = self.format_chunks_for_prompt(reranked_docs)
+        # 3. FORMATA CHUNKS (+ vizinhos do grafo)
+        chunks_formatted, images = self.format_chunks_for_prompt(self.expand_with_neighbors(reranked_docs))
         
         # 4. MONTA PROMPT FINAL
         final_prompt = f"""{self.get_system_prompt()}
@@ -355,47 +745,91 @@ Cite sempre as fontes (documento e página) de onde tirou cada informação.
                 'document': doc.metadata.get('source', 'N/A'),
                 'page': doc.metadata.get('page', 'N/A'),
                 'section': doc.metadata.get('section', 'general'),
-                'relevance': f"{relevance:.2f}"
+                'relevance': f"{relevance:.2f}",
+                'also_in': self.duplicate_references.get(doc.metadata.get('chunk_id'), [])
             })
         
-        return {
+        result = {
             'answer': answer,
             'images': images,
-            'sources': sources
+            'sources': sources,
+            'filters': filters or {},
+            'routing': routing
         }
+        if question_vector is not None and not answer.startswith("❌"):
+            self.answer_cache.store(question_vector, result, scope, version=index_version)
+        return result
+
+
+_index_version_state = {}
+
+
+def current_index_version() -> str:
+    """Versão do índice: SHA-256 do manifesto do indexador mais a assinatura (mtime, tamanho)
+    do BM25 e do grafo, reconstruídos depois do último manifesto (recalculada só quando mudam)"""
+    path = Path(RAG_CONFIG.get('manifest_path', "index_manifest.json"))
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    signature = [(str(path), stat.st_mtime_ns, stat.st_size)]
+    for artifact in (RAG_CONFIG.get('bm25_index_path', "bm25_index.json"),
+                     RAG_CONFIG.get('chunk_graph_path', "chunk_graph.json")):
+        try:
+            artifact_stat = Path(artifact).stat()
+            signature.append((artifact, artifact_stat.st_mtime_ns, artifact_stat.st_size))
+        except OSError:
+            signature.append((artifact, None, None))
+    if _index_version_state.get('signature') != signature:
+        digest = hashlib.sha256(file_sha256(path).encode())
+        digest.update(repr(signature[1:]).encode())
+        _index_version_state.update(signature=signature, version=digest.hexdigest())
+    return _index_version_state['version']
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_chatbot_engine(google_api_key: str, index_version: str) -> AdvancedRAGChatbot:
+    """Engine único por processo: clientes (embeddings, Chroma, Cohere, LLM) e índices
+    carregados uma vez e compartilhados por todas as sessões
+    
+    Chaveado pela versão do índice: depois de uma reindexação, o próximo acesso cria um
+    engine novo (banco vetorial, BM25, grafo, parent store e referências relidos juntos)
+    e o antigo sai do cache.
+    """
+    return AdvancedRAGChatbot(google_api_key=google_api_key)
 
 
 def initialize_session_state():
-    """Inicializa estado da sessão"""
+    """Inicializa estado da sessão (só o histórico; o engine é compartilhado)"""
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    
-    if 'chatbot' not in st.session_state:
-        st.session_state.chatbot = None
-    
-    if 'setup_done' not in st.session_state:
-        st.session_state.setup_done = False
 
 
-def setup_chatbot():
-    """Setup do chatbot"""
+def setup_chatbot() -> AdvancedRAGChatbot:
+    """Setup do chatbot: devolve o engine compartilhado (criado na primeira sessão)"""
     if not GOOGLE_API_KEY:
         st.error("⚠️ GOOGLE_API_KEY não configurada!")
         st.stop()
     
     # Verifica se vectorstore existe
-    if not Path("./chroma_db").exists():
+    if not vector_store_path(RAG_CONFIG).exists():
         st.error("❌ Banco vetorial não encontrado!")
         st.info("Execute primeiro: python indexer_advanced.py")
         st.stop()
     
-    if not st.session_state.setup_done:
-        with st.spinner("⚡ Inicializando..."):
-            st.session_state.chatbot = AdvancedRAGChatbot(
-                google_api_key=GOOGLE_API_KEY
-            )
-            st.session_state.setup_done = True
-        st.rerun()
+    with st.spinner("⚡ Inicializando..."):
+        chatbot = get_chatbot_engine(GOOGLE_API_KEY, current_index_version())
+    
+    # Avisos do carregamento: uma vez por sessão
+    if not chatbot.vectorstore or 'load_warnings_shown' not in st.session_state:
+        for warning in chatbot.load_warnings:
+            st.warning(warning)
+        st.session_state.load_warnings_shown = True
+    
+    if not chatbot.vectorstore:
+        get_chatbot_engine.clear()  # Não mantém em cache um engine sem banco
+        st.stop()
+    return chatbot
 
 
 def main():
@@ -416,7 +850,7 @@ def main():
     #     st.markdown("")
     #     st.markdown("")
         
-    #     if st.session_state.setup_done:
+    #     if chatbot:
     #         provider_emoji = "⚡" if LLM_PROVIDER == "groq" else "✨"
     #         provider_text = "GROQ (Ultra Rápido)" if LLM_PROVIDER == "groq" else "Gemini"
     #         retrieval_k = RAG_CONFIG.get('retrieval_top_k', 100)
@@ -459,8 +893,27 @@ def main():
     #         st.rerun()
     
     # Setup
-    if not st.session_state.setup_done:
-        setup_chatbot()
+    chatbot = setup_chatbot()
+    
+    if RAG_CONFIG.get('show_cache_stats', False):
+        query_stats = chatbot.cache_stats()['query_embeddings']
+        st.sidebar.caption(
+            f"⚡ Embeddings de perguntas: {query_stats['hits']} hits / {query_stats['misses']} misses "
+            f"({query_stats['hit_rate']:.0%}), ~{query_stats['saved_seconds']:.1f}s de API evitados"
+        )
+        if chatbot.answer_cache is not None:
+            answer_stats = chatbot.cache_stats()['answers']
+            st.sidebar.caption(
+                f"⚡ Respostas em cache: {answer_stats['hits']} hits / {answer_stats['misses']} misses "
+                f"({answer_stats['hit_rate']:.0%})"
+            )
+        if chatbot.stale_lexical_hits:
+            st.sidebar.caption(f"⚠️ {chatbot.stale_lexical_hits} resultados do BM25 fora do banco vetorial (índice em atualização)")
+        rerank_stats = chatbot.cache_stats()['rerank']
+        st.sidebar.caption(
+            f"⚡ Rerank em cache: {rerank_stats['hits']} hits / {rerank_stats['misses']} misses "
+            f"({rerank_stats['hit_rate']:.0%}), pulado em {rerank_stats['skip_rate']:.0%} das perguntas"
+        )
     
     # Chat
     st.markdown("---")
@@ -476,18 +929,7 @@ def main():
                 st.markdown("### 📷 Imagens Relacionadas")
                 
                 # Agrupa imagens por documento
-                images_by_doc = {}
-                for img_path in message["images"]:
-                    if Path(img_path).exists():
-                        # Extrai info do nome do arquivo
-                        # Formato: documento_pX_imgY.png
-                        filename = Path(img_path).stem
-                        parts = filename.split('_p')
-                        doc_name = parts[0] if parts else "Documento"
-                        
-                        if doc_name not in images_by_doc:
-                            images_by_doc[doc_name] = []
-                        images_by_doc[doc_name].append(img_path)
+                images_by_doc = chatbot.group_images_by_document(message["images"])
                 
                 # Exibe imagens agrupadas
                 for doc_name, img_paths in images_by_doc.items():
@@ -510,7 +952,8 @@ def main():
             if message.get("sources"):
                 with st.expander("📚 Ver Fontes"):
                     for i, source in enumerate(message["sources"], 1):
-                        st.markdown(f"**{i}. {source['document']}** (Página {source['page']}) - Relevância: {source['relevance']}")
+                        also_in = "".join(f", {ref['source']} p.{ref['page']}" for ref in source.get('also_in', [])[:3])
+                        st.markdown(f"**{i}. {source['document']}** (Página {source['page']}{also_in}) - Relevância: {source['relevance']}")
     
     # Input
     if prompt := st.chat_input("Digite sua pergunta sobre migração Camunda 7 → 8..."):
@@ -521,9 +964,15 @@ def main():
         
         # Gera resposta
         with st.chat_message("assistant"):
-            result = st.session_state.chatbot.ask(prompt)
+            result = chatbot.ask(prompt)
             
             st.markdown(result['answer'])
+            if result.get('cached'):
+                st.caption("⚡ Resposta do cache (pergunta equivalente já respondida)")
+            if result['filters'].get('documents'):
+                st.caption(f"🔎 Busca restrita a: {', '.join(result['filters']['documents'])}")
+            elif result.get('routing', {}).get('documents'):
+                st.caption(f"🔎 Priorizando: {', '.join(result['routing']['documents'])}")
             
             # Exibe imagens
             if result.get('images') and len(result['images']) > 0:
@@ -531,17 +980,7 @@ def main():
                 st.markdown("### 📷 Imagens Relacionadas")
                 
                 # Agrupa imagens por documento
-                images_by_doc = {}
-                for img_path in result['images']:
-                    if Path(img_path).exists():
-                        # Extrai info do nome do arquivo
-                        filename = Path(img_path).stem
-                        parts = filename.split('_p')
-                        doc_name = parts[0] if parts else "Documento"
-                        
-                        if doc_name not in images_by_doc:
-                            images_by_doc[doc_name] = []
-                        images_by_doc[doc_name].append(img_path)
+                images_by_doc = chatbot.group_images_by_document(result['images'])
                 
                 # Exibe imagens agrupadas
                 for doc_name, img_paths in images_by_doc.items():
@@ -564,7 +1003,8 @@ def main():
             if result.get('sources'):
                 with st.expander("📚 Ver Fontes"):
                     for i, source in enumerate(result['sources'], 1):
-                        st.markdown(f"**{i}. {source['document']}** (Página {source['page']}) - Relevância: {source['relevance']}")
+                        also_in = "".join(f", {ref['source']} p.{ref['page']}" for ref in source.get('also_in', [])[:3])
+                        st.markdown(f"**{i}. {source['document']}** (Página {source['page']}{also_in}) - Relevância: {source['relevance']}")
         
         # Salva resposta
         st.session_state.messages.append({
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Grafo de Vizinhança dos Chunks
+==============================
+Pré-calcula, na indexação, os vizinhos de cada chunk: anterior/próximo no mesmo
+documento (ordem de página e chunk_index) e os top-N mais similares (cosseno).
+O chatbot amplia o contexto só com consultas a esse grafo, sem embeddings nem
+buscas vetoriais extras
+"""
+
+import os
+import json
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+GRAPH_VERSION = 1
+
+# Linhas por bloco na leitura dos vetores e no cálculo dos vizinhos (matriz bloco × bloco em memória)
+_BLOCK_ROWS = 1024
+
+
+class ChunkGraph:
+    """Vizinhos de cada chunk (chaveado pelo chunk_id do metadata)"""
+
+    def __init__(self, nodes: Dict[str, Dict] = None, top_n: int = 5):
+        self.nodes = nodes or {}
+        self.top_n = top_n
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def adjacent(self, chunk_id: str) -> List[str]:
+        """Chunks anterior e próximo no documento (os que existirem)"""
+        node = self.nodes.get(chunk_id, {})
+        return [neighbor for neighbor in (node.get('prev'), node.get('next')) if neighbor]
+
+    def similar(self, chunk_id: str, n: int = None) -> List[Tuple[str, float]]:
+        """Top-n chunks mais similares (chunk_id, cosseno)"""
+        similar = self.nodes.get(chunk_id, {}).get('similar', [])
+        return [tuple(item) for item in similar[:n]]
+
+    @classmethod
+    def build(cls, ids: List[str], metadatas: List[Dict], embeddings: np.ndarray,
+              top_n: int = 5) -> "ChunkGraph":
+        """Monta o grafo a partir dos chunks do banco (IDs, metadata e vetores, lidos em blocos)"""
+        nodes = {chunk_id: {'prev': None, 'next': None, 'similar': []} for chunk_id in ids}
+
+        # Anterior/próximo: ordem de leitura dentro de cada documento
+        by_source = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            by_source.setdefault(metadata.get('source'), []).append(
+                (metadata.get('page') or 0, metadata.get('chunk_index') or 0, chunk_id)
+            )
+        for chunks in by_source.values():
+            chunks.sort()
+            for (_, _, previous), (_, _, current) in zip(chunks, chunks[1:]):
+                nodes[previous]['next'] = current
+                nodes[current]['prev'] = previous
+
+        # Vizinhos semânticos: cosseno em blocos, excluindo o próprio chunk
+        if top_n > 0 and len(ids) > 1:
+            for start, top, scores in _top_similar(embeddings, min(top_n, len(ids) - 1)):
+                for offset, (row, row_scores) in enumerate(zip(top, scores)):
+                    nodes[ids[start + offset]]['similar'] = [
+                        [ids[j], round(float(score), 4)] for j, score in zip(row, row_scores)
+                    ]
+
+        return cls(nodes, top_n=top_n)
+
+    @classmethod
+    def from_vector_store(cls, vectorstore, top_n: int = 5) -> "ChunkGraph":
+        """Monta o grafo com todos os chunks do banco vetorial (Chroma ou NumPy)
+
+        Os vetores são lidos em páginas para um arquivo temporário (memmap), então nem a
+        leitura nem o cálculo dos vizinhos mantêm todos os embeddings em memória.
+        """
+        data = vectorstore.get(include=['metadatas'])
+        metadatas = [metadata or {} for metadata in data['metadatas']]
+        # Chaveado pelo chunk_id do metadata (índices antigos do Chroma usam UUIDs como ID)
+        ids = [metadata.get('chunk_id') or store_id for store_id, metadata in zip(data['ids'], metadatas)]
+        if top_n <= 0 or len(ids) < 2:
+            return cls.build(ids, metadatas, np.zeros((len(ids), 0), dtype=np.float32), top_n=top_n)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = None
+            for start in range(0, len(ids), _BLOCK_ROWS):
+                page = vectorstore.get(limit=_BLOCK_ROWS, offset=start, include=['embeddings'])
+                block = np.asarray(page['embeddings'], dtype=np.float32)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=np.float32,
+                        shape=(len(ids), block.shape[1])
+                    )
+                vectors[start:start + len(block)] = block
+            graph = cls.build(ids, metadatas, vectors, top_n=top_n)
+            del vectors
+        return graph
+
+    def save(self, path: str):
+        """Salva o grafo de forma atômica"""
+        path = Path(path)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({'version': GRAPH_VERSION, 'top_n': self.top_n, 'nodes': self.nodes},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ChunkGraph"]:
+        """Carrega o grafo; None se não existir ou for de outra versão"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get('version') != GRAPH_VERSION:
+            return None
+        return cls(data['nodes'], top_n=data['top_n'])
+
+
+def _normalized(vectors) -> np.ndarray:
+    """Bloco de vetores em float32 com norma 1 (vetores nulos ficam zerados)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_similar(embeddings, n: int):
+    """Top-n vizinhos (cosseno) de cada linha, excluindo ela mesma, por blocos de linhas
+
+    Compara cada bloco de linhas com um bloco de colunas por vez e mantém só os n
+    melhores até ali: a memória fica em bloco × bloco, não em bloco × N. Gera
+    (início do bloco, índices, scores), melhor primeiro.
+    """
+    total = len(embeddings)
+    for start in range(0, total, _BLOCK_ROWS):
+        rows = _normalized(embeddings[start:start + _BLOCK_ROWS])
+        best_scores = np.full((len(rows), 0), -np.inf, dtype=np.float32)
+        best_index = np.zeros((len(rows), 0), dtype=np.int64)
+        for column in range(0, total, _BLOCK_ROWS):
+            scores = rows @ _normalized(embeddings[column:column + _BLOCK_ROWS]).T
+            # Exclui o próprio chunk (a diagonal, quando os blocos se cruzam)
+            for offset in range(max(start, column), min(start + len(rows), column + scores.shape[1])):
+                scores[offset - start, offset - column] = -np.inf
+            candidates = np.concatenate([best_scores, scores], axis=1)
+            candidate_index = np.concatenate(
+                [best_index, np.broadcast_to(np.arange(column, column + scores.shape[1]), scores.shape)], axis=1
+            )
+            keep = np.argpartition(-candidates, min(n, candidates.shape[1]) - 1, axis=1)[:, :n]
+            best_scores = np.take_along_axis(candidates, keep, axis=1)
+            best_index = np.take_along_axis(candidate_index, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        yield start, np.take_along_axis(best_index, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
@@ -56,6 +56,92 @@ GENERATION_CONFIG = {
 # ============================================
 
 RAG_CONFIG = {
-    "retrieval_top_k": 50,   # ⚡ Otimizado para velocidade
+    "retrieval_top_k": 30,   # ⚡ Com a busca híbrida, menos candidatos bastam
     "rerank_top_n": 5,       # ⚡ Top-5 mais relevantes
+    "reranker": "cohere",           # "cohere", "lexical" (BM25 local), "onnx" (cross-encoder local) ou "none"
+    "rerank_model": "rerank-multilingual-v3.0",  # Modelo de reranking da Cohere
+    "rerank_timeout": 10,           # ⚡ Segundos; Cohere lento ou fora do ar cai no reranker lexical
+    "onnx_reranker_dir": "models/cross-encoder",  # model.onnx + tokenizer.json (reranker "onnx")
+    "rerank_skip_margin": 0,        # Pula o rerank se o 1º candidato se destaca na similaridade densa (0 = sempre
+                                    # rerankeia). Sem valor avaliado: para ligar, rode as perguntas de teste com 0,
+                                    # anote o top-N rerankeado e suba a margem (ex.: 0.5) só enquanto as perguntas
+                                    # puladas mantiverem o mesmo 1º resultado
+    "rerank_cache_size": 256,       # ⚡ LRU de reranks (pergunta + candidatos): repetições não chamam a API
+    "embedding_cache_path": "embedding_cache.sqlite3",  # ⚡ Cache persistente das perguntas (None = só memória)
+    "query_embedding_cache_size": 1024,  # ⚡ LRU em memória dos embeddings de perguntas
+    "show_cache_stats": False,      # Mostra na barra lateral os acertos dos caches
+    "answer_cache": False,          # ⚡ Reusa a resposta de perguntas equivalentes (milissegundos em vez de segundos)
+    "answer_cache_threshold": 0.95, # Cosseno mínimo entre as perguntas: valor inicial, não avaliado; antes de ligar,
+                                    # meça com pares de perguntas reais (mesma intenção vs. intenção diferente)
+    "answer_cache_ttl": 3600,       # Segundos até a resposta expirar
+    "answer_cache_size": 500,       # Máximo de respostas (LRU)
+    "manifest_path": "index_manifest.json",  # Versão do índice (o cache é descartado quando muda)
+    "vector_backend": "chroma",  # "chroma" ou "numpy" (mesmo valor usado no INDEXER_CONFIG)
+    "numpy_index_dir": "./numpy_index",
+    "vector_quantization": "none",  # "int8"/"binary": busca nos códigos + rescoring em float32
+    "rescore_candidates": 200,      # Candidatos reordenados em precisão total
+    "hybrid_search": True,          # ⚡ BM25 + vetorial fundidos com RRF (identificadores exatos)
+    "bm25_index_path": "bm25_index.json",
+    "bm25_top_k": 30,               # Candidatos do ranking lexical
+    "rrf_k": 60,                    # Constante do Reciprocal Rank Fusion
+    "auto_filters": True,           # ⚡ Prioriza no RRF o documento inferido da pergunta (ex.: "Data Migrator"); não filtra
+    "coarse_to_fine": False,        # Busca em dois estágios: páginas → chunks das páginas escolhidas. Só compensa
+                                    # com vector_backend "numpy" em corpus grande (pontua menos chunks); sempre
+                                    # perde recall contra a busca plana (meça com benchmark_retrieval.py coarse)
+    "coarse_top_pages": 20,         # Páginas selecionadas no estágio grosso
+    "parent_store_path": "parent_store.sqlite3",  # Texto das páginas (gerado pelo indexador)
+    "parent_context_chars": 300,    # Contexto extra em volta de cada chunk; trechos sobrepostos são unidos
+    "chunk_graph_path": "chunk_graph.json",  # Grafo de vizinhança gerado pelo indexador
+    "neighbor_expansion_top": 3,    # Top chunks do rerank que ganham os vizinhos anterior/próximo
+    "similar_expansion": 0,         # Vizinhos semânticos extras por chunk do top (0 = desligado)
+}
+
+# ============================================
+# CONFIGURAÇÕES DO INDEXADOR
+# ============================================
+
+INDEXER_CONFIG = {
+    "docs_path": "documentação_migracao_camunda",
+    "vector_backend": "chroma",              # "chroma" ou "numpy" (índice local memory-mapped)
+    "persist_directory": "./chroma_db",
+    "numpy_index_dir": "./numpy_index",      # Usado com vector_backend = "numpy"
+    "vector_dtype": "float32",               # "float32" ou "float16" (metade do disco/memória)
+    "vector_quantization": "none",           # "none", "int8" (4× menos RAM) ou "binary" (32× menos RAM)
+    "collection_name": "camunda_migration",
+    "manifest_path": "index_manifest.json",  # ⚡ Hashes dos PDFs (reindexação incremental)
+    "checkpoint_path": "index_checkpoint.json",  # Lotes já gravados (retomada após falhas)
+    "workers": 0,                            # ⚡ Processos para extrair PDFs (0 = todos os núcleos, 1 = sequencial)
+    "pypdf_fallback": True,                  # Usa pypdf quando o PyMuPDF não extrai texto
+    "page_cache_dir": "page_cache",          # ⚡ Texto extraído por página (re-chunking sem reprocessar PDFs)
+    "chunk_size": 500,                       # ⚡ Chunks pequenos (busca precisa); o prompt recebe o trecho expandido
+    "chunk_overlap": 100,                    # Overlap entre chunks (alterar chunking re-chunka tudo a partir do cache)
+    "parent_store_path": "parent_store.sqlite3",  # Texto das páginas para expandir os chunks no prompt
+    "image_format": "png",                   # "png" ou "webp" (ambos sem perdas)
+    "image_compression": 6,                  # Nível de compressão (PNG 0-9, WebP 0-6)
+    "image_optimize": False,                 # PNG otimizado (menor, porém mais lento)
+    "image_filters": {                       # 🧹 Descarta imagens decorativas antes de salvar
+        "min_width": 48,                     # px
+        "min_height": 48,                    # px
+        "min_bytes": 1024,                   # Tamanho mínimo da imagem no PDF
+        "max_aspect_ratio": 12.0,            # Linhas e faixas finas
+        "min_color_stddev": 3.0,             # Cor (quase) uniforme = fundo
+    },
+    "embedding_batch_size": 100,             # ⚡ Textos por chamada à API de embeddings
+    "embedding_concurrency": 4,              # ⚡ Lotes em paralelo
+    "embedding_max_retries": 6,              # Retentativas em 429/erros transitórios (backoff + Retry-After)
+    "embedding_cache_path": "embedding_cache.sqlite3",  # ⚡ Cache de embeddings (compartilhado com o chatbot)
+    "upsert_batch_size": None,               # Chunks por lote embedado e gravado no banco (memória constante);
+                                             # None = embedding_batch_size × embedding_concurrency (enche as requisições
+                                             # em paralelo). Menor que isso, parte da concorrência fica ociosa
+    "bm25_enabled": True,                    # ⚡ Índice lexical BM25 para a busca híbrida
+    "bm25_index_path": "bm25_index.json",
+    "page_index": True,                      # ⚡ Coleção de páginas para a busca em dois estágios
+    "page_embedding_chars": 6000,            # Texto da página usado no embedding
+    "dedup_enabled": True,                   # ⚡ Colapsa chunks quase duplicados de um mesmo documento (MinHash/LSH)
+    "dedup_threshold": 0.9,                  # Similaridade de Jaccard mínima para considerar duplicata
+    "dedup_index_path": "dedup_index.json",  # Assinaturas e referências das duplicatas
+    "furniture_min_page_ratio": 0.5,         # Linha em ≥ 50% das páginas = cabeçalho/rodapé (removida)
+    "chunk_graph_enabled": True,             # ⚡ Vizinhos pré-calculados (contexto sem novas buscas)
+    "chunk_graph_path": "chunk_graph.json",
+    "chunk_graph_neighbors": 5,              # Top-N vizinhos semânticos por chunk
 }
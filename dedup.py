@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Deduplicação de Chunks
+======================
+Remove "mobília" de página (cabeçalhos, rodapés e navegação repetidos em várias
+páginas de um documento) e colapsa chunks quase duplicados com MinHash + LSH
+dentro de cada documento: só o primeiro chunk (canônico) é indexado e as demais
+ocorrências ficam registradas como referências em um arquivo ao lado do índice.
+Chunks iguais em documentos diferentes continuam indexados uma vez por documento,
+para que buscas filtradas por documento não percam conteúdo
+"""
+
+import os
+import re
+import json
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+INDEX_VERSION = 2
+
+# Primo > 2^32: permutações (a·h + b) mod p sobre hashes de 32 bits sem overflow em uint64
+_PRIME = np.uint64(4294967311)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _normalize_line(line: str) -> str:
+    """Linha sem números (nº de página) e espaços extras, para comparar cabeçalhos/rodapés"""
+    return " ".join(re.sub(r"\d+", "#", line.lower()).split())
+
+
+def strip_page_furniture(documents: List[Document], min_page_ratio: float = 0.5,
+                         min_pages: int = 3, min_line_chars: int = 10) -> int:
+    """Remove linhas repetidas em boa parte das páginas de um documento (cabeçalho, rodapé, menu)
+
+    Linhas curtas ("}", "NOTE") são mantidas: repetem naturalmente em código e avisos.
+    Altera o texto das páginas no lugar e devolve quantas linhas foram removidas.
+    """
+    if len(documents) < min_pages:
+        return 0
+
+    # Em quantas páginas cada linha (normalizada) aparece
+    page_counts = {}
+    for doc in documents:
+        for line in {_normalize_line(line) for line in doc.page_content.splitlines()}:
+            if len(line) >= min_line_chars and any(c.isalpha() for c in line):
+                page_counts[line] = page_counts.get(line, 0) + 1
+
+    threshold = max(min_pages, min_page_ratio * len(documents))
+    furniture = {line for line, count in page_counts.items() if count >= threshold}
+    if not furniture:
+        return 0
+
+    removed = 0
+    for doc in documents:
+        kept = []
+        for line in doc.page_content.splitlines():
+            if _normalize_line(line) in furniture:
+                removed += 1
+            else:
+                kept.append(line)
+        doc.page_content = "\n".join(kept)
+    return removed
+
+
+class MinHasher:
+    """Assinaturas MinHash de shingles de palavras (estimam a similaridade de Jaccard)"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+
+    def shingles(self, text: str) -> Set[str]:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(text)],
+                          dtype=np.uint64)
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Jaccard estimado: fração de posições iguais nas assinaturas"""
+        return float(np.mean(first == second))
+
+
+class DedupIndex:
+    """Chunks canônicos (assinaturas + LSH) e as duplicatas colapsadas em cada um
+
+    Os buckets do LSH são separados por documento, então um chunk só colapsa em um
+    canônico do mesmo PDF. Persistido em JSON ao lado do banco vetorial; os buckets
+    são refeitos ao carregar.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm precisa ser múltiplo de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.canonical: Dict[str, Dict] = {}   # chunk_id → {'file', 'signature'}
+        self.duplicates: Dict[str, Dict] = {}  # chunk_id → {'canonical', 'file', 'source', 'page'}
+        self._buckets: Optional[Dict[Tuple, List[str]]] = None
+
+    def _band_keys(self, signature: np.ndarray, file_name: str) -> List[Tuple]:
+        rows = len(signature) // self.bands
+        return [(file_name, band, *signature[band * rows:(band + 1) * rows].tolist()) for band in range(self.bands)]
+
+    def _ensure_buckets(self):
+        if self._buckets is None:
+            self._buckets = {}
+            for chunk_id, entry in self.canonical.items():
+                for key in self._band_keys(entry['signature'], entry['file']):
+                    self._buckets.setdefault(key, []).append(chunk_id)
+
+    def find_duplicate(self, signature: np.ndarray, file_name: str) -> Optional[str]:
+        """Chunk canônico quase idêntico do mesmo PDF (Jaccard estimado ≥ threshold), se houver"""
+        self._ensure_buckets()
+        candidates = {chunk_id for key in self._band_keys(signature, file_name) for chunk_id in self._buckets.get(key, [])}
+        best, best_similarity = None, self.threshold
+        for chunk_id in sorted(candidates):
+            similarity = MinHasher.similarity(signature, self.canonical[chunk_id]['signature'])
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def add_canonical(self, chunk_id: str, signature: np.ndarray, file_name: str):
+        self.canonical[chunk_id] = {'file': file_name, 'signature': signature}
+        if self._buckets is not None:
+            for key in self._band_keys(signature, file_name):
+                self._buckets.setdefault(key, []).append(chunk_id)
+
+    def add_duplicate(self, chunk_id: str, canonical_id: str, file_name: str, source: str, page: int):
+        self.duplicates[chunk_id] = {'canonical': canonical_id, 'file': file_name, 'source': source, 'page': page}
+
+    def deduplicate(self, chunks: List[Document], file_name: str) -> List[Document]:
+        """Chunks a indexar: quase duplicatas de chunks canônicos são só registradas"""
+        kept = []
+        for chunk in chunks:
+            signature = self.hasher.signature(chunk.page_content)
+            canonical_id = self.find_duplicate(signature, file_name)
+            if canonical_id is None:
+                self.add_canonical(chunk.metadata['chunk_id'], signature, file_name)
+                kept.append(chunk)
+            else:
+                self.add_duplicate(chunk.metadata['chunk_id'], canonical_id, file_name,
+                                   chunk.metadata.get('source'), chunk.metadata.get('page'))
+        return kept
+
+    def remove_files(self, file_names: Iterable[str]):
+        """Esquece os chunks (canônicos e duplicatas) dos PDFs alterados/removidos"""
+        file_names = set(file_names)
+        self.canonical = {cid: entry for cid, entry in self.canonical.items() if entry['file'] not in file_names}
+        self.duplicates = {cid: entry for cid, entry in self.duplicates.items() if entry['file'] not in file_names}
+        self._buckets = None
+
+    def references(self) -> Dict[str, List[Dict]]:
+        """Outras ocorrências (documento, página) de cada chunk canônico"""
+        return _group_references(self.duplicates)
+
+    def save(self, path: str):
+        """Salva o índice de forma atômica"""
+        path = Path(path)
+        data = {
+            'version': INDEX_VERSION,
+            'threshold': self.threshold,
+            'num_perm': self.hasher.num_perm,
+            'bands': self.bands,
+            'canonical': {cid: {'file': entry['file'], 'signature': entry['signature'].tolist()}
+                          for cid, entry in self.canonical.items()},
+            'duplicates': self.duplicates,
+        }
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.9) -> "DedupIndex":
+        """Carrega o índice (vazio se não existir ou se os parâmetros mudaram)"""
+        path = Path(path)
+        if path.exists():
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION and data.get('threshold') == threshold:
+                index = cls(threshold=threshold, num_perm=data['num_perm'], bands=data['bands'])
+                index.canonical = {
+                    cid: {'file': entry['file'], 'signature': np.array(entry['signature'], dtype=np.uint64)}
+                    for cid, entry in data['canonical'].items()
+                }
+                index.duplicates = data['duplicates']
+                return index
+        return cls(threshold=threshold)
+
+
+def _group_references(duplicates: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+    references = {}
+    for entry in duplicates.values():
+        references.setdefault(entry['canonical'], []).append({'source': entry['source'], 'page': entry['page']})
+    return references
+
+
+def load_references(path: str) -> Dict[str, List[Dict]]:
+    """Só as referências das duplicatas (para o chatbot citar as outras ocorrências)"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return _group_references(json.load(f).get('duplicates', {}))
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Pipeline de Embeddings
+======================
+Envolve um modelo de embeddings LangChain com lotes configuráveis, concorrência
+limitada e retentativas com backoff exponencial (respeitando Retry-After em 429),
+além de um cache persistente (SQLite) de embeddings por modelo e hash do texto e,
+para as perguntas, um LRU em memória na frente dele
+"""
+
+import re
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from rag_cache import LRUCache, normalize_query
+
+
+# Modelo de embeddings do índice: indexador, chatbot e benchmark precisam usar o mesmo
+# (vetores de modelos diferentes não são comparáveis e o cache é chaveado pelo modelo)
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Status HTTP que valem uma nova tentativa
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Trechos de mensagens de erro transitórios (gRPC/REST do Google)
+RETRYABLE_MARKERS = (
+    "429", "resource_exhausted", "resource exhausted", "quota", "rate limit",
+    "503", "unavailable", "deadline", "timed out", "timeout", "connection reset",
+    "500 internal", "502", "504",
+)
+
+
+def _exception_chain(exc: BaseException):
+    """Percorre a exceção e suas causas (os SDKs costumam encapsular o erro HTTP)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """Extrai o status HTTP de uma exceção, se houver"""
+    for candidate in (getattr(exc, 'status_code', None), getattr(exc, 'code', None)):
+        if isinstance(candidate, int):
+            return candidate
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Tempo de espera pedido pelo servidor (header Retry-After ou RetryInfo do Google)"""
+    for error in _exception_chain(exc):
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+
+        # Ex.: "Please retry in 12.5s" ou "'retryDelay': '12s'"
+        match = re.search(r"retry(?:delay)?['\"]?\s*(?:in|:)\s*['\"]?([\d.]+)\s*s", str(error), re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Erro transitório (rate limit, indisponibilidade, timeout)?"""
+    for error in _exception_chain(exc):
+        status = _status_code(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        message = str(error).lower()
+        if any(marker in message for marker in RETRYABLE_MARKERS):
+            return True
+    return False
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza espaços em branco (quebras de linha do PDF não mudam o embedding)"""
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    """Hash do texto normalizado (chave do cache)"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache persistente de embeddings em SQLite, chaveado por (modelo, hash do texto)
+    
+    O mesmo arquivo pode ser compartilhado pelo indexador e pelo chatbot (modo WAL).
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                   model TEXT NOT NULL,
+                   text_hash TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   PRIMARY KEY (model, text_hash)
+               )"""
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Busca os embeddings dos textos; None para os que não estão no cache"""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+
+        with self._lock:
+            # Consulta em blocos (limite de parâmetros do SQLite)
+            unique_hashes = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique_hashes), 500):
+                block = unique_hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(block))})",
+                    [model, *block]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+
+            results = [found.get(key) for key in hashes]
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Grava os embeddings no cache"""
+        rows = [
+            (model, text_hash(text), array('f', vector).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def hit_rate(self) -> float:
+        """Fração de consultas atendidas pelo cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings em lotes, com concorrência limitada e retentativas com backoff"""
+
+    def __init__(self, base: Embeddings, batch_size: int = 100, max_concurrency: int = 4,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 cache: EmbeddingCache = None, model_name: str = None,
+                 query_cache: LRUCache = None):
+        self.base = base
+        self.cache = cache
+        self.query_cache = query_cache
+        self.model_name = model_name or getattr(base, 'model', None) or type(base).__name__
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self.stats = {'texts': 0, 'batches': 0, 'retries': 0, 'seconds': 0.0,
+                      'query_calls': 0, 'query_seconds': 0.0}
+
+    def _call_with_retry(self, func, *args):
+        """Executa a chamada à API com backoff exponencial + jitter"""
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+
+                # Full jitter; se o servidor pediu um tempo (Retry-After), espera pelo menos isso
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+
+                with self._lock:
+                    self.stats['retries'] += 1
+                attempt += 1
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings (consultando o cache antes da API), preservando a ordem dos textos"""
+        if not texts:
+            return []
+
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        # Documentos e consultas usam task types diferentes na API: chaves separadas
+        cache_model = f"{self.model_name}:document"
+        vectors = self.cache.get_many(cache_model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            new_vectors = self._embed_uncached([texts[i] for i in missing])
+            self.cache.put_many(cache_model, [texts[i] for i in missing], new_vectors)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+
+        return vectors
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Chama a API em lotes paralelos, preservando a ordem dos textos"""
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self._call_with_retry(self.base.embed_documents, batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = list(executor.map(
+                    lambda batch: self._call_with_retry(self.base.embed_documents, batch),
+                    batches
+                ))
+
+        with self._lock:
+            self.stats['texts'] += len(texts)
+            self.stats['batches'] += len(batches)
+            self.stats['seconds'] += time.perf_counter() - start
+
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding de uma consulta (LRU em memória → cache SQLite → API com retentativas)"""
+        key = (self.model_name, normalize_query(text))
+        if self.query_cache is not None:
+            vector = self.query_cache.get(key)
+            if vector is not None:
+                return vector
+
+        cache_model = f"{self.model_name}:query"
+        vector = self.cache.get_many(cache_model, [text])[0] if self.cache is not None else None
+        if vector is None:
+            start = time.perf_counter()
+            vector = self._call_with_retry(self.base.embed_query, text)
+            with self._lock:
+                self.stats['query_calls'] += 1
+                self.stats['query_seconds'] += time.perf_counter() - start
+            if self.cache is not None:
+                self.cache.put_many(cache_model, [text], [vector])
+
+        if self.query_cache is not None:
+            self.query_cache.put(key, vector)
+        return vector
+
+    def query_cache_stats(self) -> Dict:
+        """Acertos do LRU de perguntas e latência de API evitada (estimada pela média das chamadas)"""
+        stats = self.query_cache.stats() if self.query_cache is not None else {'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+        calls = self.stats['query_calls']
+        avg_seconds = self.stats['query_seconds'] / calls if calls else 0.0
+        stats['api_calls'] = calls
+        stats['avg_api_seconds'] = avg_seconds
+        stats['saved_seconds'] = stats['hits'] * avg_seconds
+        return stats
+
+    def throughput(self) -> float:
+        """Embeddings por segundo acumulados até agora"""
+        seconds = self.stats['seconds']
+        return self.stats['texts'] / seconds if seconds > 0 else 0.0
+
+    def stats_summary(self) -> str:
+        """Resumo legível das estatísticas"""
+        summary = (
+            f"{self.stats['texts']} embeddings em {self.stats['seconds']:.1f}s "
+            f"({self.throughput():.1f}/s, {self.stats['batches']} lotes, "
+            f"{self.stats['retries']} retentativas)"
+        )
+        if self.cache is not None:
+            summary += f", cache: {self.cache.hits} hits / {self.cache.misses} misses"
+        if self.query_cache is not None:
+            summary += (f", LRU de perguntas: {self.query_cache.hits} hits / "
+                        f"{self.query_cache.misses} misses ({self.query_cache.hit_rate():.0%})")
+        return summary
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Snapshot do Índice
+==================
+Empacota o índice pronto (banco vetorial, coleção de páginas, índices auxiliares,
+imagens e manifesto) em um único .tar.gz versionado com checksums, e desempacota
+verificando cada arquivo em outra máquina — réplicas novas sobem em segundos,
+sem reindexar nem pagar embeddings
+"""
+
+import io
+import os
+import json
+import shutil
+import tarfile
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from rich.console import Console
+
+from vector_index import vector_store_path
+
+try:
+    from config import INDEXER_CONFIG
+except ImportError:
+    INDEXER_CONFIG = {}
+
+console = Console()
+
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MANIFEST = "snapshot.json"
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 do conteúdo de um arquivo (em blocos de 1 MB)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_artifacts(config: Dict) -> List[Path]:
+    """Arquivos e diretórios que compõem o índice servido pelo chatbot"""
+    candidates = [
+        vector_store_path(config),
+        vector_store_path(config, level="page"),  # Mesmo diretório no Chroma
+        Path(config.get('manifest_path', "index_manifest.json")),
+        Path(config.get('bm25_index_path', "bm25_index.json")),
+        Path(config.get('parent_store_path', "parent_store.sqlite3")),
+        Path(config.get('dedup_index_path', "dedup_index.json")),
+        Path(config.get('chunk_graph_path', "chunk_graph.json")),
+        Path("image_metadata.json"),
+        Path("extracted_images"),
+    ]
+    artifacts = []
+    for path in candidates:
+        if path.exists() and path not in artifacts:
+            artifacts.append(path)
+    return artifacts
+
+
+def _relative(path: Path) -> str:
+    """Caminho relativo ao diretório atual (o snapshot nunca grava fora dele)"""
+    relative = Path(os.path.relpath(path.resolve(), Path.cwd()))
+    if relative.parts and relative.parts[0] == "..":
+        raise ValueError(f"{path} está fora do diretório do projeto")
+    return relative.as_posix()
+
+
+def _iter_files(artifacts: List[Path]):
+    for artifact in artifacts:
+        if artifact.is_dir():
+            yield from sorted(path for path in artifact.rglob("*") if path.is_file())
+        else:
+            yield artifact
+
+
+def export_snapshot(output: str = None, config: Dict = None) -> Path:
+    """Gera o snapshot (.tar.gz) do índice atual"""
+    config = config or INDEXER_CONFIG
+
+    # Indexação interrompida no meio: o banco não bate com o manifesto
+    checkpoint_path = Path(config.get('checkpoint_path', "index_checkpoint.json"))
+    if checkpoint_path.exists() and json.loads(checkpoint_path.read_text()).get('files'):
+        raise RuntimeError("Há uma indexação interrompida (checkpoint). Conclua a indexação antes do snapshot.")
+
+    artifacts = index_artifacts(config)
+    if not any(path == vector_store_path(config) for path in artifacts):
+        raise FileNotFoundError(f"Banco vetorial não encontrado em {vector_store_path(config)}")
+
+    files = {}
+    for path in _iter_files(artifacts):
+        if path.suffix == ".tmp":
+            continue  # Escrita atômica em andamento/abandonada
+        files[_relative(path)] = {'sha256': file_sha256(path), 'size': path.stat().st_size}
+
+    manifest_path = Path(config.get('manifest_path', "index_manifest.json"))
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'index_version': file_sha256(manifest_path) if manifest_path.exists() else None,
+        'vector_backend': config.get('vector_backend', "chroma"),
+        'collection_name': config.get('collection_name', "camunda_migration"),
+        'files': files,
+    }
+
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        suffix = f"_{snapshot['index_version'][:12]}" if snapshot['index_version'] else ""
+        output = f"index_snapshot_{stamp}{suffix}.tar.gz"
+    output = Path(output)
+
+    tmp_output = output.with_name(f".{output.name}.tmp")
+    with tarfile.open(tmp_output, "w:gz") as tar:
+        data = json.dumps(snapshot, indent=2, ensure_ascii=False).encode("utf-8")
+        info = tarfile.TarInfo(SNAPSHOT_MANIFEST)
+        info.size = len(data)
+        info.mtime = int(datetime.now(timezone.utc).timestamp())
+        tar.addfile(info, fileobj=io.BytesIO(data))
+        for relative in files:
+            tar.add(relative, arcname=f"index/{relative}", recursive=False)
+    os.replace(tmp_output, output)
+
+    total = sum(entry['size'] for entry in files.values())
+    console.print(f"[green]✓[/green] Snapshot {output}: {len(files)} arquivos, "
+                  f"{total / 1024 / 1024:.1f} MB → {output.stat().st_size / 1024 / 1024:.1f} MB comprimido")
+    return output
+
+
+def import_snapshot(archive: str, target: str = ".", force: bool = False) -> Dict:
+    """Desempacota um snapshot, verifica os checksums e instala os arquivos em `target`
+
+    Nada é instalado se algum arquivo estiver faltando, sobrando ou corrompido.
+    """
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=target, prefix=".snapshot_") as tmp:
+        tmp = Path(tmp)
+        with tarfile.open(archive, "r:gz") as tar:
+            for member in tar.getmembers():
+                name = Path(member.name)
+                if name.is_absolute() or ".." in name.parts or not (member.isfile() or member.isdir()):
+                    raise ValueError(f"Entrada suspeita no snapshot: {member.name}")
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(tmp, filter="data")  # Python ≥ 3.12: bloqueia links e permissões especiais
+            else:
+                tar.extractall(tmp)
+
+        snapshot = json.loads((tmp / SNAPSHOT_MANIFEST).read_text(encoding="utf-8"))
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Versão de snapshot não suportada: {snapshot.get('version')}")
+
+        # Verificação: todos os arquivos do manifesto presentes e íntegros, nenhum a mais
+        extracted_root = tmp / "index"
+        extracted = {
+            path.relative_to(extracted_root).as_posix()
+            for path in extracted_root.rglob("*") if path.is_file()
+        } if extracted_root.exists() else set()
+        expected = set(snapshot['files'])
+        if extracted != expected:
+            raise ValueError(
+                f"Snapshot inconsistente: {len(expected - extracted)} arquivos faltando, "
+                f"{len(extracted - expected)} inesperados"
+            )
+        for relative, entry in snapshot['files'].items():
+            if file_sha256(extracted_root / relative) != entry['sha256']:
+                raise ValueError(f"Checksum inválido: {relative}")
+
+        # Instala: cada item de topo (diretório do banco, imagens, JSONs) é trocado inteiro
+        top_level = sorted({Path(relative).parts[0] for relative in snapshot['files']})
+        existing = [name for name in top_level if (target / name).exists()]
+        if existing and not force:
+            raise FileExistsError(f"Já existem no destino: {', '.join(existing)} (use --force para substituir)")
+        for name in top_level:
+            destination = target / name
+            if destination.is_dir():
+                shutil.rmtree(destination)
+            elif destination.exists():
+                destination.unlink()
+            os.replace(extracted_root / name, destination)
+
+    console.print(f"[green]✓[/green] Snapshot {archive} instalado em {target.resolve()} "
+                  f"({len(snapshot['files'])} arquivos verificados, índice {str(snapshot['index_version'])[:12]})")
+    return snapshot
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Exporta/importa o índice como um artefato único")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Empacota o índice atual em um .tar.gz")
+    export_parser.add_argument("-o", "--output", help="Arquivo de saída (padrão: index_snapshot_<data>_<versão>.tar.gz)")
+
+    import_parser = subparsers.add_parser("import", help="Desempacota e verifica um snapshot")
+    import_parser.add_argument("archive", help="Arquivo .tar.gz gerado pelo export")
+    import_parser.add_argument("--target", default=".", help="Diretório do projeto onde instalar o índice")
+    import_parser.add_argument("--force", action="store_true", help="Substitui um índice já existente")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "export":
+            export_snapshot(args.output)
+        else:
+            import_snapshot(args.archive, args.target, force=args.force)
+    except Exception as e:
+        console.print(f"[bold red]❌ {e}[/bold red]")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
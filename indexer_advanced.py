@@ -7,154 +7,345 @@ Processa PDFs, extrai texto e imagens, cria embeddings e banco vetorial
 
 import os
 import json
+import gzip
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterator, Callable, Optional
 import hashlib
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.docstore.document import Document
-from pypdf import PdfReader
-import fitz  # PyMuPDF para extração de imagens reais
-from PIL import Image
+import fitz  # PyMuPDF: texto e imagens reais em uma única passada
+try:
+    from pypdf import PdfReader  # Fallback opcional para extração de texto
+except ImportError:
+    PdfReader = None
+from PIL import Image, ImageStat
 import io
 
+from embedding_pipeline import BatchedEmbeddings, EmbeddingCache, normalize_text, EMBEDDING_MODEL
+from vector_index import NumpyVectorStore, load_vector_store, vector_store_path
+from bm25_index import BM25Index
+from dedup import DedupIndex, strip_page_furniture
+from chunk_graph import ChunkGraph
+from parent_store import ParentStore
 from config import GOOGLE_API_KEY
+try:
+    from config import INDEXER_CONFIG
+except ImportError:
+    INDEXER_CONFIG = {}
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 
 console = Console()
 
 
+# Limites padrão para descartar imagens decorativas
+DEFAULT_IMAGE_FILTERS = {
+    'min_width': 48,           # px
+    'min_height': 48,          # px
+    'min_bytes': 1024,         # tamanho da imagem embutida no PDF
+    'max_aspect_ratio': 12.0,  # linhas/faixas finas
+    'min_color_stddev': 3.0,   # desvio padrão em tons de cinza (0-255); abaixo disso = fundo uniforme
+}
+
+
 class AdvancedPDFProcessor:
     """Processador avançado de PDFs com extração de imagens"""
     
-    def __init__(self, docs_path: str):
+    def __init__(self, docs_path: str, config: Dict = None):
         self.docs_path = Path(docs_path)
+        self.config = config or {}
         self.images_dir = Path("extracted_images")
         self.images_dir.mkdir(exist_ok=True)
         self.image_metadata = {}
+        self._xref_cache = {}  # xref -> arquivo no store (por PDF)
+        # pypdf só é usado se o PyMuPDF não conseguir abrir o PDF ou não extrair texto da página
+        self.use_pypdf_fallback = self.config.get('pypdf_fallback', True) and PdfReader is not None
         
-    def extract_images_from_pdf(self, pdf_path: Path) -> Dict[int, List[str]]:
-        """Extrai IMAGENS REAIS de um PDF (diagramas, gráficos, etc) e salva localmente"""
-        console.print(f"  [yellow]📷[/yellow] Extraindo imagens REAIS de {pdf_path.name}...")
+        # Formato final das imagens: "png" ou "webp" (sempre sem perdas)
+        self.image_format = self.config.get('image_format', "png").lower()
+        if self.image_format not in ("png", "webp"):
+            raise ValueError(f"image_format inválido: {self.image_format} (use 'png' ou 'webp')")
+        self.image_compression = self.config.get('image_compression', 6)  # PNG: 0-9, WebP: 0-6
+        self.image_optimize = self.config.get('image_optimize', False)    # PNG: passada extra de otimização
         
-        images_by_page = {}
-        total_images = 0
+        # Filtros de imagens decorativas (ícones, bullets, fundos): aplicados antes de salvar
+        self.image_filters = {**DEFAULT_IMAGE_FILTERS, **self.config.get('image_filters', {})}
         
-        try:
-            # Abre PDF com PyMuPDF
-            pdf_document = fitz.open(str(pdf_path))
+        # Cache do texto extraído por página (chave: hash do PDF + parâmetros de extração)
+        self.page_cache_dir = Path(self.config.get('page_cache_dir', "page_cache"))
+        self.page_cache_dir.mkdir(exist_ok=True)
+    
+    def _encode_image(self, img: Image.Image, image_bytes: bytes, image_ext: str) -> Tuple[bytes, str]:
+        """Converte a imagem (já decodificada) para o formato configurado, inteiramente em memória"""
+        if image_ext == self.image_format and not self.image_optimize:
+            return image_bytes, image_ext  # Já está no formato final
+        
+        buffer = io.BytesIO()
+        
+        if self.image_format == "webp":
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            img.save(buffer, "WEBP", lossless=True, method=min(self.image_compression, 6))
+        else:
+            if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            img.save(buffer, "PNG", compress_level=self.image_compression, optimize=self.image_optimize)
+        
+        return buffer.getvalue(), self.image_format
+    
+    def _is_decorative(self, width: int, height: int, size_bytes: int) -> bool:
+        """Filtro barato (sem decodificar): dimensões, tamanho em bytes e proporção"""
+        filters = self.image_filters
+        if width < filters['min_width'] or height < filters['min_height']:
+            return True
+        if size_bytes < filters['min_bytes']:
+            return True
+        aspect_ratio = max(width, height) / max(min(width, height), 1)
+        return aspect_ratio > filters['max_aspect_ratio']
+    
+    def _is_uniform(self, img: Image.Image) -> bool:
+        """Imagem de cor (quase) uniforme: desvio padrão baixo em uma miniatura em tons de cinza"""
+        thumbnail = img.convert("L")
+        thumbnail.thumbnail((64, 64))
+        return ImageStat.Stat(thumbnail).stddev[0] < self.image_filters['min_color_stddev']
+    
+    def _store_image(self, image_bytes: bytes, image_ext: str) -> Optional[str]:
+        """Salva a imagem no store endereçado por conteúdo e devolve o nome do arquivo
+        (ou None se for descartada como decorativa)
+        
+        O nome é o hash dos pixels decodificados: a mesma imagem repetida em outras
+        páginas ou PDFs (mesmo que comprimida de outra forma) reaproveita o mesmo arquivo.
+        """
+        img = Image.open(io.BytesIO(image_bytes))
+        img.load()
+        
+        if self._is_uniform(img):
+            return None
+        
+        digest = hashlib.sha256(f"{img.mode}:{img.size}:".encode())
+        digest.update(img.tobytes())
+        img_filename = f"{digest.hexdigest()[:24]}.{self.image_format}"
+        img_path = self.images_dir / img_filename
+        
+        if not img_path.exists():
+            # Converte em memória para o formato final (uma única escrita em disco)
+            data, _ = self._encode_image(img, image_bytes, image_ext)
             
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                page_number = page_num + 1  # 1-indexed
+            # Escrita atômica: outro processo pode estar salvando a mesma imagem
+            tmp_path = img_path.with_name(f".{img_filename}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as img_file:
+                img_file.write(data)
+            os.replace(tmp_path, img_path)
+        
+        return img_filename
+    
+    def _add_image_reference(self, img_filename: str, source: str, page_number: int, img_index: int):
+        """Registra uma ocorrência (documento, página) de uma imagem do store"""
+        reference = {'document': source, 'page': page_number, 'index': img_index}
+        
+        if img_filename not in self.image_metadata:
+            # Campos de topo = primeira ocorrência (formato antigo do image_metadata.json)
+            self.image_metadata[img_filename] = {
+                **reference,
+                'path': str(self.images_dir / img_filename),
+                'references': []
+            }
+        self.image_metadata[img_filename]['references'].append(reference)
+    
+    def _extract_page_images(self, pdf_document, page, page_number: int, pdf_path: Path) -> List[str]:
+        """Extrai as IMAGENS REAIS de uma página já aberta (diagramas, gráficos, etc) e salva localmente"""
+        page_images = []
+        
+        # Obtém lista de imagens na página
+        image_list = page.get_images(full=True)
+        
+        # Extrai cada imagem
+        for img_index, img in enumerate(image_list):
+            try:
+                xref = img[0]  # Referência da imagem
                 
-                # Obtém lista de imagens na página
-                image_list = page.get_images(full=True)
+                # A mesma xref repetida no PDF (logos, cabeçalhos) é extraída uma única vez
+                if xref in self._xref_cache:
+                    img_filename = self._xref_cache[xref]
+                else:
+                    base_image = pdf_document.extract_image(xref)
+                    if self._is_decorative(base_image["width"], base_image["height"], len(base_image["image"])):
+                        img_filename = None
+                    else:
+                        img_filename = self._store_image(base_image["image"], base_image["ext"])
+                    self._xref_cache[xref] = img_filename  # None = decorativa (contada em process_pdf)
                 
-                if not image_list:
-                    continue  # Sem imagens nesta página
+                if img_filename is None:
+                    continue  # Imagem decorativa
                 
-                if page_number not in images_by_page:
-                    images_by_page[page_number] = []
+                img_path = str(self.images_dir / img_filename)
+                if img_path in page_images:
+                    continue
                 
-                # Extrai cada imagem
-                for img_index, img in enumerate(image_list):
-                    try:
-                        xref = img[0]  # Referência da imagem
-                        
-                        # Extrai a imagem
-                        base_image = pdf_document.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        image_ext = base_image["ext"]
-                        
-                        # Nome do arquivo
-                        img_filename = f"{pdf_path.stem}_p{page_number}_img{img_index}.{image_ext}"
-                        img_path = self.images_dir / img_filename
-                        
-                        # Salva imagem
-                        with open(img_path, "wb") as img_file:
-                            img_file.write(image_bytes)
-                        
-                        # Converte para PNG se necessário (para consistência)
-                        if image_ext != "png":
-                            img = Image.open(img_path)
-                            png_filename = f"{pdf_path.stem}_p{page_number}_img{img_index}.png"
-                            png_path = self.images_dir / png_filename
-                            img.save(png_path, "PNG")
-                            img_path.unlink()  # Remove original
-                            img_path = png_path
-                            img_filename = png_filename
-                        
-                        images_by_page[page_number].append(str(img_path))
-                        total_images += 1
-                        
-                        # Armazena metadata
-                        self.image_metadata[img_filename] = {
-                            'document': pdf_path.stem,
-                            'page': page_number,
-                            'path': str(img_path),
-                            'index': img_index
-                        }
-                        
-                    except Exception as e:
-                        console.print(f"    [dim]⚠️  Erro ao extrair imagem {img_index} da página {page_number}: {e}[/dim]")
-                        continue
-            
-            pdf_document.close()
-            
-            if total_images > 0:
-                console.print(f"    ✓ {total_images} imagens REAIS extraídas de {len(images_by_page)} páginas")
-            else:
-                console.print(f"    [dim]⚠️  Nenhuma imagem encontrada neste PDF[/dim]")
-            
-        except Exception as e:
-            console.print(f"    [red]✗[/red] Erro ao processar PDF: {e}")
+                page_images.append(img_path)
+                self._add_image_reference(img_filename, pdf_path.stem, page_number, img_index)
+                
+            except Exception as e:
+                console.print(f"    [dim]⚠️  Erro ao extrair imagem {img_index} da página {page_number}: {e}[/dim]")
+                continue
         
-        return images_by_page
+        return page_images
+    
+    def _read_pages_with_pypdf(self, pdf_path: Path) -> List[str]:
+        """Fallback: texto de cada página via pypdf"""
+        reader = PdfReader(str(pdf_path))
+        return [page.extract_text() or "" for page in reader.pages]
     
     def process_pdf(self, pdf_path: Path) -> Tuple[List[Document], Dict]:
-        """Processa um PDF: extrai texto, metadados e imagens"""
+        """Processa um PDF: extrai texto, metadados e imagens em uma única passada pelas páginas
+        
+        Levanta a exceção se o PDF não puder ser lido (nem pelo pypdf): o indexador não o
+        registra no manifesto e tenta de novo na próxima execução.
+        """
         console.print(f"\n[cyan]📄 Processando:[/cyan] {pdf_path.name}")
         
         documents = []
+        images_by_page = {}
+        pages = []  # (número da página, texto)
+        self._xref_cache = {}
         
         try:
-            # Extrai imagens
-            images_by_page = self.extract_images_from_pdf(pdf_path)
-            
-            # Lê PDF
-            reader = PdfReader(str(pdf_path))
-            
-            for page_num, page in enumerate(reader.pages, start=1):
-                text = page.extract_text()
+            # Abre o PDF uma única vez com PyMuPDF: texto e imagens na mesma passada
+            with fitz.open(str(pdf_path)) as pdf_document:
+                total_pages = len(pdf_document)
+                fallback_pages = None
                 
-                if text.strip():
-                    # Identifica se há imagens nesta página
-                    page_images = images_by_page.get(page_num, [])
+                for page_number, page in enumerate(pdf_document, start=1):
+                    text = page.get_text()
                     
-                    doc = Document(
-                        page_content=text,
-                        metadata={
-                            'source': pdf_path.stem,
-                            'page': page_num,
-                            'total_pages': len(reader.pages),
-                            'has_images': len(page_images) > 0,
-                            'images': json.dumps(page_images),  # ← Converte lista para JSON string
-                            'section': self._identify_section(text)
-                        }
-                    )
-                    documents.append(doc)
-            
-            console.print(f"  [green]✓[/green] {len(documents)} páginas processadas")
-            
+                    if not text.strip() and self.use_pypdf_fallback:
+                        if fallback_pages is None:
+                            fallback_pages = self._read_pages_with_pypdf(pdf_path)
+                        text = fallback_pages[page_number - 1]
+                    
+                    page_images = self._extract_page_images(pdf_document, page, page_number, pdf_path)
+                    if page_images:
+                        images_by_page[page_number] = page_images
+                    
+                    pages.append((page_number, text))
+        
         except Exception as e:
-            console.print(f"  [red]✗[/red] Erro: {e}")
+            if not self.use_pypdf_fallback:
+                console.print(f"  [red]✗[/red] Erro: {e}")
+                raise
+            
+            console.print(f"  [yellow]⚠️  PyMuPDF falhou ({e}), usando pypdf (sem imagens)[/yellow]")
+            try:
+                page_texts = self._read_pages_with_pypdf(pdf_path)
+            except Exception as e:
+                console.print(f"  [red]✗[/red] Erro: {e}")
+                raise
+            total_pages = len(page_texts)
+            pages = list(enumerate(page_texts, start=1))
+        
+        total_images = sum(len(images) for images in images_by_page.values())
+        if total_images > 0:
+            unique_images = len(set(self._xref_cache.values()) - {None})
+            console.print(
+                f"    ✓ {unique_images} imagens REAIS distintas extraídas "
+                f"({total_images} ocorrências em {len(images_by_page)} páginas)"
+            )
+        else:
+            console.print(f"    [dim]⚠️  Nenhuma imagem encontrada neste PDF[/dim]")
+        
+        decorative = sum(1 for filename in self._xref_cache.values() if filename is None)
+        if decorative:
+            console.print(f"    [dim]🧹 {decorative} imagens decorativas descartadas[/dim]")
+        
+        for page_num, text in pages:
+            if text.strip():
+                # Identifica se há imagens nesta página
+                page_images = images_by_page.get(page_num, [])
+                
+                doc = Document(
+                    page_content=text,
+                    metadata={
+                        'source': pdf_path.stem,
+                        'page': page_num,
+                        'total_pages': total_pages,
+                        'has_images': len(page_images) > 0,
+                        'images': json.dumps(page_images),  # ← Converte lista para JSON string
+                        'section': self._identify_section(text)
+                    }
+                )
+                documents.append(doc)
+        
+        console.print(f"  [green]✓[/green] {len(documents)} páginas processadas")
         
         return documents, images_by_page
     
+    def extraction_key(self) -> str:
+        """Hash dos parâmetros que alteram o resultado da extração (invalida o cache de páginas)"""
+        params = {
+            'image_format': self.image_format,
+            'image_filters': self.image_filters,
+            'pypdf_fallback': self.use_pypdf_fallback,
+        }
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+    
+    def page_cache_path(self, file_hash: str) -> Path:
+        """Arquivo do cache de páginas de um PDF"""
+        return self.page_cache_dir / f"{file_hash}_{self.extraction_key()}.jsonl.gz"
+    
+    def load_cached_pages(self, file_hash: str) -> Tuple[List[Document], Dict]:
+        """Lê páginas e metadata de imagens do cache (None se ausente ou com imagens faltando)
+        
+        Formato JSONL comprimido: 1ª linha = metadata de imagens, demais = uma página por linha.
+        """
+        cache_path = self.page_cache_path(file_hash)
+        if not cache_path.exists():
+            return None
+        
+        try:
+            with gzip.open(cache_path, "rt", encoding="utf-8") as f:
+                image_metadata = json.loads(f.readline())
+                documents = [
+                    Document(page_content=page['text'], metadata=page['metadata'])
+                    for page in map(json.loads, f)
+                ]
+        except Exception as e:
+            console.print(f"  [yellow]⚠️  Cache de páginas inválido ({e}), reprocessando[/yellow]")
+            return None
+        
+        if not all(Path(info['path']).exists() for info in image_metadata.values()):
+            return None  # Imagens apagadas: precisa extrair de novo
+        
+        return documents, image_metadata
+    
+    def save_cached_pages(self, file_hash: str, documents: List[Document], image_metadata: Dict):
+        """Grava páginas e metadata de imagens no cache (escrita atômica)"""
+        cache_path = self.page_cache_path(file_hash)
+        tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(image_metadata, ensure_ascii=False) + "\n")
+            for doc in documents:
+                f.write(json.dumps({'text': doc.page_content, 'metadata': doc.metadata}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, cache_path)
+    
+    def load_or_process_pdf(self, pdf_path: Path, file_hash: str = None) -> Tuple[List[Document], Dict]:
+        """Páginas de um PDF a partir do cache; se não houver, processa o PDF e grava o cache"""
+        if file_hash:
+            cached = self.load_cached_pages(file_hash)
+            if cached is not None:
+                console.print(f"\n[cyan]📄 {pdf_path.name}:[/cyan] {len(cached[0])} páginas do cache (sem reprocessar o PDF)")
+                return cached
+        
+        self.image_metadata = {}
+        documents, _ = self.process_pdf(pdf_path)
+        if file_hash and documents:
+            self.save_cached_pages(file_hash, documents, self.image_metadata)
+        return documents, self.image_metadata
+    
     def _identify_section(self, text: str) -> str:
         """Identifica a seção do documento baseado no texto"""
         text_lower = text.lower()
@@ -178,79 +369,510 @@ class AdvancedPDFProcessor:
         return 'general'
 
 
+def _process_pdf_worker(docs_path: str, config: Dict, pdf_path: str, file_hash: str = None) -> Tuple[List[Document], Dict]:
+    """Executado em um processo do pool: processa um PDF e devolve documentos e metadata de imagens"""
+    processor = AdvancedPDFProcessor(docs_path, config)
+    return processor.load_or_process_pdf(Path(pdf_path), file_hash)
+
+
 class AdvancedIndexer:
     """Indexador avançado com embeddings Google e ChromaDB"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, config: Dict = None):
         self.api_key = api_key
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=api_key
+        self.config = {**INDEXER_CONFIG, **(config or {})}
+        # Embeddings em lotes concorrentes, com retentativas para 429/erros transitórios
+        # e cache persistente (só chunks novos ou alterados chamam a API)
+        self.embeddings = BatchedEmbeddings(
+            GoogleGenerativeAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                google_api_key=api_key
+            ),
+            batch_size=self.config.get('embedding_batch_size', 100),
+            max_concurrency=self.config.get('embedding_concurrency', 4),
+            max_retries=self.config.get('embedding_max_retries', 6),
+            cache=EmbeddingCache(self.config.get('embedding_cache_path', "embedding_cache.sqlite3"))
         )
         self.vectorstore = None
-        self.processor = AdvancedPDFProcessor("documentação_migracao_camunda")
+        self.page_vectorstore = None
+        self.persist_directory = str(vector_store_path(self.config))
+        self.collection_name = self.config.get('collection_name', "camunda_migration")
+        # Onde os chunks estão gravados: se mudar (outro backend/diretório), o manifesto não vale mais
+        self.vector_store_location = {
+            'vector_backend': self.config.get('vector_backend', "chroma"),
+            'persist_directory': self.persist_directory,
+            'collection_name': self.collection_name,
+        }
+        self.manifest_path = Path(self.config.get('manifest_path', "index_manifest.json"))
+        self.checkpoint_path = Path(self.config.get('checkpoint_path', "index_checkpoint.json"))
+        self.processor = AdvancedPDFProcessor(
+            self.config.get('docs_path', "documentação_migracao_camunda"),
+            self.config
+        )
+        
+        # Processos para extração dos PDFs (1 = sequencial, 0 = todos os núcleos)
+        workers = self.config.get('workers', 1)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        
+        # Coleção de páginas (estágio grosso da busca em dois estágios)
+        self.page_index_enabled = self.config.get('page_index', True)
+        self.page_embedding_chars = self.config.get('page_embedding_chars', 6000)
+        
+        # Parent store: texto integral das páginas, para expandir os chunks (filhos) no prompt
+        self.parent_store_path = Path(self.config.get('parent_store_path', "parent_store.sqlite3"))
+        
+        # Deduplicação: remove cabeçalhos/rodapés repetidos e colapsa chunks quase duplicados
+        self.dedup_enabled = self.config.get('dedup_enabled', True)
+        self.dedup_threshold = self.config.get('dedup_threshold', 0.9)
+        self.dedup_index_path = Path(self.config.get('dedup_index_path', "dedup_index.json"))
+        self.furniture_min_page_ratio = self.config.get('furniture_min_page_ratio', 0.5)
+        self.dedup_index = None
+        
+        # Parâmetros de chunking (mudanças aqui re-chunkam tudo a partir do cache de páginas)
+        self.chunking = {
+            'chunk_size': self.config.get('chunk_size', 1000),
+            'chunk_overlap': self.config.get('chunk_overlap', 200),
+            'page_index': self.page_index_enabled,
+            'start_index': True,  # Posição do chunk na página (metadata 'start_index')
+            'dedup_threshold': self.dedup_threshold if self.dedup_enabled else None,
+            'dedup_scope': "document" if self.dedup_enabled else None,
+            'furniture_min_page_ratio': self.furniture_min_page_ratio if self.dedup_enabled else None,
+        }
+        
+        # Chunks por upsert no banco vetorial (cada lote é embedado e persistido de uma vez).
+        # Padrão: lotes de embedding × concorrência, para um upsert ocupar todas as requisições em paralelo
+        self.upsert_batch_size = self.config.get('upsert_batch_size') or (
+            self.config.get('embedding_batch_size', 100) * self.config.get('embedding_concurrency', 4)
+        )
+        
+        # Índice lexical (BM25) mantido ao lado do banco vetorial para a busca híbrida
+        self.bm25_enabled = self.config.get('bm25_enabled', True)
+        self.bm25_index_path = Path(self.config.get('bm25_index_path', "bm25_index.json"))
         
-    def create_chunks(self, documents: List[Document]) -> List[Document]:
+        # Grafo de vizinhança (anterior/próximo + top-N similares) para ampliar o contexto sem buscas
+        self.chunk_graph_enabled = self.config.get('chunk_graph_enabled', True)
+        self.chunk_graph_path = Path(self.config.get('chunk_graph_path', "chunk_graph.json"))
+        self.chunk_graph_neighbors = self.config.get('chunk_graph_neighbors', 5)
+        self.stats = {}
+    
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        """Calcula o SHA-256 do conteúdo de um arquivo (em blocos de 1 MB)"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def load_manifest(self) -> Dict:
+        """Carrega o manifesto da última indexação (hashes, chunks e imagens por PDF)"""
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                console.print(f"[yellow]⚠️  Manifesto inválido, reindexando tudo: {e}[/yellow]")
+        return {'version': 1, 'files': {}}
+    
+    def save_manifest(self, manifest: Dict):
+        """Salva o manifesto de forma atômica"""
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def load_checkpoint(self) -> Dict:
+        """Carrega o checkpoint dos PDFs interrompidos no meio (chunks já persistidos)"""
+        if self.checkpoint_path.exists():
+            try:
+                with open(self.checkpoint_path, "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                console.print(f"[yellow]⚠️  Checkpoint inválido, ignorando: {e}[/yellow]")
+        return {'files': {}}
+    
+    def save_checkpoint(self, checkpoint: Dict):
+        """Salva o checkpoint de forma atômica (removendo o arquivo quando vazio)"""
+        if not checkpoint['files']:
+            self.checkpoint_path.unlink(missing_ok=True)
+            return
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def load_image_metadata(self) -> Dict:
+        """Carrega o image_metadata.json existente"""
+        if Path("image_metadata.json").exists():
+            try:
+                with open("image_metadata.json", "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                console.print(f"[yellow]⚠️  image_metadata.json inválido, recriando: {e}[/yellow]")
+        return {}
+    
+    def iter_processed_pdfs(self, pdf_files: List[Path],
+                            on_file_done: Callable[[Path], None] = None,
+                            file_hashes: Dict[str, str] = None) -> Iterator[Tuple[Path, List[Document], Dict]]:
+        """Processa os PDFs (em paralelo se workers > 1) e devolve os resultados na ordem de entrada
+        
+        No modo paralelo no máximo 2 × workers PDFs ficam em andamento ou aguardando
+        consumo, e `on_file_done` é chamado assim que cada PDF termina (em qualquer ordem).
+        Com `file_hashes`, PDFs já extraídos antes vêm do cache de páginas.
+        PDFs que falharam vêm com documentos None (os demais seguem normalmente).
+        """
+        file_hashes = file_hashes or {}
+        
+        if self.workers <= 1 or len(pdf_files) <= 1:
+            for pdf_file in pdf_files:
+                try:
+                    docs, image_metadata = self.processor.load_or_process_pdf(pdf_file, file_hashes.get(pdf_file.name))
+                except Exception:
+                    docs, image_metadata = None, {}
+                if on_file_done:
+                    on_file_done(pdf_file)
+                yield pdf_file, docs, image_metadata
+            return
+        
+        docs_path = str(self.processor.docs_path)
+        window = self.workers * 2
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}   # índice -> future em andamento
+            finished = {}  # índice -> resultado aguardando a vez
+            next_submit = 0
+            next_yield = 0
+            
+            while next_yield < len(pdf_files):
+                while next_submit < len(pdf_files) and len(pending) + len(finished) < window:
+                    pdf_file = pdf_files[next_submit]
+                    pending[next_submit] = executor.submit(
+                        _process_pdf_worker, docs_path, self.config, str(pdf_file), file_hashes.get(pdf_file.name)
+                    )
+                    next_submit += 1
+                
+                if next_yield in finished:
+                    docs, image_metadata = finished.pop(next_yield)
+                    yield pdf_files[next_yield], docs, image_metadata
+                    next_yield += 1
+                    continue
+                
+                done, _ = wait(pending.values(), return_when=FIRST_COMPLETED)
+                for index, future in list(pending.items()):
+                    if future in done:
+                        try:
+                            finished[index] = future.result()
+                        except Exception as e:
+                            console.print(f"  [red]✗[/red] {pdf_files[index].name}: {e}")
+                            finished[index] = (None, {})
+                        del pending[index]
+                        if on_file_done:
+                            on_file_done(pdf_files[index])
+    
+    def create_chunks(self, documents: List[Document], verbose: bool = True) -> List[Document]:
         """Cria chunks dos documentos com overlap"""
-        console.print("\n[cyan]✂️  Criando chunks...[/cyan]")
+        if verbose:
+            console.print("\n[cyan]✂️  Criando chunks...[/cyan]")
         
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # Tamanho do chunk
-            chunk_overlap=200,  # Overlap para manter contexto
+            chunk_size=self.chunking['chunk_size'],  # Tamanho do chunk
+            chunk_overlap=self.chunking['chunk_overlap'],  # Overlap para manter contexto
             length_function=len,
+            add_start_index=True,  # Offset do chunk no texto da página (expansão para o parent)
             separators=["\n\n", "\n", " ", ""]
         )
         
         chunks = text_splitter.split_documents(documents)
         
-        # Adiciona ID único a cada chunk
-        for i, chunk in enumerate(chunks):
-            chunk.metadata['chunk_id'] = f"chunk_{i}"
-            chunk.metadata['chunk_index'] = i
+        # Adiciona ID estável a cada chunk: derivado do conteúdo (não da posição),
+        # então reexecuções e retomadas geram os mesmos IDs
+        counters = {}
+        occurrences = {}
+        for chunk in chunks:
+            source = chunk.metadata['source']
+            i = counters.get(source, 0)
+            counters[source] = i + 1
+            
+            key = (source, chunk.metadata.get('page'), normalize_text(chunk.page_content))
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            
+            chunk.metadata['chunk_id'] = self.stable_chunk_id(*key, occurrence)
+            chunk.metadata['chunk_index'] = i  # Posição do chunk dentro do documento
+            chunk.metadata['page_key'] = self.page_key(source, chunk.metadata.get('page'))
         
-        console.print(f"  [green]✓[/green] {len(chunks)} chunks criados")
+        if verbose:
+            console.print(f"  [green]✓[/green] {len(chunks)} chunks criados")
         return chunks
     
-    def build_vectorstore(self, chunks: List[Document]) -> Chroma:
-        """Cria banco vetorial com ChromaDB"""
-        console.print("\n[cyan]🗄️  Criando banco vetorial...[/cyan]")
+    def create_page_documents(self, documents: List[Document]) -> List[Document]:
+        """Um documento por página para a coleção de páginas (texto truncado para o embedding)
+        
+        Leva o mesmo metadata dos chunks da página, então os mesmos filtros valem nos dois estágios.
+        """
+        pages = []
+        for doc in documents:
+            text = doc.page_content.strip()
+            if not text:
+                continue
+            key = self.page_key(doc.metadata['source'], doc.metadata.get('page'))
+            pages.append(Document(
+                page_content=text[:self.page_embedding_chars],
+                metadata={**doc.metadata, 'page_key': key, 'chunk_id': key}
+            ))
+        return pages
+    
+    @staticmethod
+    def page_key(source: str, page: int) -> str:
+        """Chave da página: liga os chunks à sua entrada na coleção de páginas"""
+        return f"{source}#p{page}"
+    
+    @staticmethod
+    def stable_chunk_id(source: str, page: int, normalized_text: str, occurrence: int = 0) -> str:
+        """ID determinístico: documento + página + texto (+ ocorrência, para textos repetidos)"""
+        digest = hashlib.sha1(
+            f"{source}\x00{page}\x00{occurrence}\x00{normalized_text}".encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{source}_{digest}"
+    
+    def load_vectorstore(self) -> Chroma:
+        """Abre (ou cria) o banco vetorial persistido (Chroma ou índice NumPy, conforme vector_backend)"""
+        if self.vectorstore is None:
+            self.vectorstore = load_vector_store(self.config, self.embeddings)
+        return self.vectorstore
+    
+    def load_page_vectorstore(self):
+        """Abre (ou cria) a coleção de páginas"""
+        if self.page_vectorstore is None:
+            self.page_vectorstore = load_vector_store(self.config, self.embeddings, level="page")
+        return self.page_vectorstore
+    
+    @staticmethod
+    def iter_batches(items: List, batch_size: int) -> Iterator[List]:
+        """Divide uma lista em lotes de tamanho fixo"""
+        for i in range(0, len(items), batch_size):
+            yield items[i:i + batch_size]
+    
+    def iter_file_chunks(self, processed: Iterator[Tuple[Path, List[Document], Dict]]
+                         ) -> Iterator[Tuple[Path, List[Document], List[Document], Dict[str, str], Dict]]:
+        """Etapa páginas → chunks (+ documentos e textos de página), um PDF por vez (as páginas são liberadas em seguida)"""
+        for pdf_file, docs, image_metadata in processed:
+            if docs is None:
+                yield pdf_file, None, [], {}, {}  # Falha no processamento
+                continue
+            if self.dedup_enabled:
+                self.stats['furniture_lines'] += strip_page_furniture(docs, self.furniture_min_page_ratio)
+            chunks = self.create_chunks(docs, verbose=False)
+            if self.dedup_index is not None:
+                total_chunks = len(chunks)
+                chunks = self.dedup_index.deduplicate(chunks, pdf_file.name)
+                self.stats['duplicates'] += total_chunks - len(chunks)
+            pages = self.create_page_documents(docs) if self.page_index_enabled else []
+            if self.dedup_index is not None:
+                # Páginas sem nenhum chunk próprio (só duplicatas) não entram no estágio grosso
+                page_keys = {chunk.metadata['page_key'] for chunk in chunks}
+                pages = [page for page in pages if page.metadata['page_key'] in page_keys]
+            self._update_statistics(docs, chunks)
+            parent_pages = {self.page_key(doc.metadata['source'], doc.metadata.get('page')): doc.page_content
+                            for doc in docs}
+            yield pdf_file, chunks, pages, parent_pages, image_metadata
+    
+    def upsert_chunks(self, chunks: List[Document], skip_ids: set = None,
+                      on_batch_done: Callable[[List[str]], None] = None) -> int:
+        """Etapas embeddings → upsert, em lotes: cada lote é persistido antes do próximo
         
-        persist_directory = "./chroma_db"
+        Chunks em `skip_ids` (já persistidos em uma execução interrompida) são pulados;
+        `on_batch_done` recebe os IDs de cada lote gravado (para o checkpoint).
+        """
+        vectorstore = self.load_vectorstore()
+        if skip_ids:
+            chunks = [chunk for chunk in chunks if chunk.metadata['chunk_id'] not in skip_ids]
         
-        try:
-            vectorstore = Chroma.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                persist_directory=persist_directory,
-                collection_name="camunda_migration"
-            )
-            
-            console.print(f"  [green]✓[/green] Banco vetorial criado em {persist_directory}")
-            console.print(f"  [green]✓[/green] {len(chunks)} chunks indexados")
-            
-            return vectorstore
+        total = 0
+        for batch in self.iter_batches(chunks, self.upsert_batch_size):
+            batch_ids = [chunk.metadata['chunk_id'] for chunk in batch]
+            vectorstore.add_documents(batch, ids=batch_ids)
+            total += len(batch)
+            if on_batch_done:
+                on_batch_done(batch_ids)
+        return total
+    
+    @staticmethod
+    def merge_image_metadata(images_metadata: Dict, new_metadata: Dict):
+        """Mescla o metadata de imagens de um PDF no metadata global (unindo as referências)"""
+        for filename, info in new_metadata.items():
+            if filename in images_metadata:
+                images_metadata[filename].setdefault('references', []).extend(info.get('references', []))
+            else:
+                images_metadata[filename] = info
+    
+    def save_image_metadata(self, images_metadata: Dict):
+        """Salva o image_metadata.json de forma atômica"""
+        with open("image_metadata.json.tmp", "w") as f:
+            json.dump(images_metadata, f, indent=2)
+        os.replace("image_metadata.json.tmp", "image_metadata.json")
+    
+    def _remove_images(self, images_metadata: Dict, source: str):
+        """Remove do metadata as referências de um documento (os arquivos órfãos são
+        apagados só no fim da execução, por `_collect_garbage`)"""
+        for filename, info in list(images_metadata.items()):
+            references = info.get('references') or [
+                {'document': info['document'], 'page': info['page'], 'index': info.get('index', 0)}
+            ]
+            remaining = [ref for ref in references if ref['document'] != source]
             
-        except Exception as e:
-            console.print(f"  [red]✗[/red] Erro: {e}")
-            raise
+            if not remaining:
+                del images_metadata[filename]
+            elif len(remaining) < len(references):
+                info.update(remaining[0])
+                info['references'] = remaining
+    
+    def _collect_garbage(self, images_metadata: Dict, file_hashes: Dict[str, str]):
+        """Apaga imagens sem referência e entradas do cache de páginas de PDFs que não existem mais"""
+        referenced = {Path(info['path']).name for info in images_metadata.values()}
+        for img_path in self.processor.images_dir.iterdir():
+            if img_path.is_file() and img_path.name not in referenced:
+                img_path.unlink(missing_ok=True)
+        
+        valid_cache = {self.processor.page_cache_path(file_hash).name for file_hash in file_hashes.values()}
+        for cache_path in self.processor.page_cache_dir.glob("*.jsonl.gz"):
+            if cache_path.name not in valid_cache:
+                cache_path.unlink(missing_ok=True)
     
-    def index_all_documents(self):
-        """Indexa todos os PDFs da documentação"""
+    def build_lexical_index(self):
+        """Reconstrói o índice BM25 a partir de todos os chunks do banco vetorial"""
+        index = BM25Index.from_vector_store(self.load_vectorstore())
+        index.save(self.bm25_index_path)
+        console.print(f"[green]✓[/green] Índice BM25: {len(index)} chunks, {len(index.postings)} termos ({self.bm25_index_path})")
+    
+    def build_chunk_graph(self):
+        """Recalcula o grafo de vizinhança a partir de todos os chunks do banco vetorial"""
+        graph = ChunkGraph.from_vector_store(self.load_vectorstore(), top_n=self.chunk_graph_neighbors)
+        graph.save(self.chunk_graph_path)
+        console.print(f"[green]✓[/green] Grafo de vizinhança: {len(graph)} chunks, top-{graph.top_n} similares ({self.chunk_graph_path})")
+    
+    def index_all_documents(self, full: bool = False):
+        """Indexa os PDFs da documentação (apenas os novos, alterados ou removidos)
+        
+        Pipeline em streaming: PDF → páginas → chunks → lotes de embeddings → upsert.
+        Só alguns PDFs ficam em memória por vez. O manifesto é salvo a cada PDF
+        concluído e o checkpoint a cada lote gravado, então uma nova execução após
+        uma falha (quota, OOM...) retoma de onde parou sem duplicar chunks.
+        """
         console.print("\n[bold cyan]🚀 Iniciando Indexação Avançada[/bold cyan]")
         console.print("="*70 + "\n")
         
-        pdf_files = list(self.processor.docs_path.glob("*.pdf"))
+        pdf_files = sorted(self.processor.docs_path.glob("*.pdf"))
         
         if not pdf_files:
             console.print("[red]❌ Nenhum PDF encontrado![/red]")
             return
         
-        console.print(f"📚 Encontrados {len(pdf_files)} documentos\n")
+        console.print(f"📚 Encontrados {len(pdf_files)} documentos ({self.workers} processo(s))\n")
+        
+        manifest = self.load_manifest()
+        checkpoint = self.load_checkpoint()
+        all_images_metadata = self.load_image_metadata()
+        parent_store = ParentStore(str(self.parent_store_path))
+        if self.dedup_enabled:
+            self.dedup_index = DedupIndex.load(self.dedup_index_path, threshold=self.dedup_threshold)
+        
+        # Manifesto de outro banco (backend, diretório ou coleção) ou banco vazio com manifesto
+        # cheio (diretório apagado): o manifesto não descreve o que está no banco
+        location_changed = manifest.get('vector_store', self.vector_store_location) != self.vector_store_location
+        store_empty = bool(manifest['files']) and not self.load_vectorstore().get(limit=1, include=[])['ids']
+        if location_changed or store_empty:
+            console.print("[yellow]🗄️  Banco vetorial diferente do registrado no manifesto (ou vazio): recriando o índice[/yellow]\n")
+        
+        # Sem manifesto (ou --full) não dá para saber o que já está no banco:
+        # recria a coleção do zero
+        if full or not self.manifest_path.exists() or location_changed or store_empty:
+            self.load_vectorstore().delete_collection()
+            self.vectorstore = None
+            self.load_page_vectorstore().delete_collection()
+            self.page_vectorstore = None
+            for info in all_images_metadata.values():
+                Path(info['path']).unlink(missing_ok=True)
+            all_images_metadata = {}
+            parent_store.clear()
+            if self.dedup_enabled:
+                self.dedup_index = DedupIndex(threshold=self.dedup_threshold)
+            manifest = {'version': 1, 'files': {}}
+            checkpoint = {'files': {}}
+        
+        # Parâmetros de chunking mudaram: todos os PDFs são re-chunkados (do cache de páginas).
+        # Chunks parciais de execuções interrompidas usam o chunking antigo: viram órfãos
+        orphan_ids = []
+        if manifest.get('chunking', self.chunking) != self.chunking:
+            console.print("[yellow]✂️  Parâmetros de chunking alterados: re-chunkando todos os PDFs[/yellow]\n")
+            for entry in manifest['files'].values():
+                entry['sha256'] = None
+            for entry in checkpoint['files'].values():
+                orphan_ids.extend(entry['done_ids'])
+            checkpoint['files'] = {}
+        manifest['chunking'] = self.chunking
+        record_location = manifest.get('vector_store') != self.vector_store_location  # Manifestos antigos
+        manifest['vector_store'] = self.vector_store_location
+        
+        # Compara os hashes atuais com os do manifesto
+        current_hashes = {pdf.name: self.file_hash(pdf) for pdf in pdf_files}
+        changed_files = [
+            pdf for pdf in pdf_files
+            if manifest['files'].get(pdf.name, {}).get('sha256') != current_hashes[pdf.name]
+        ]
+        removed_names = [name for name in manifest['files'] if name not in current_hashes]
+        
+        # PDFs interrompidos que mudaram (ou sumiram) desde então: chunks parciais são órfãos
+        for name, entry in list(checkpoint['files'].items()):
+            if current_hashes.get(name) != entry['sha256']:
+                orphan_ids.extend(entry['done_ids'])
+                del checkpoint['files'][name]
+        
+        if not changed_files and not removed_names and not orphan_ids:
+            console.print("[green]✓[/green] Nenhum PDF novo, alterado ou removido — índice já está atualizado\n")
+            parent_store.close()
+            if record_location:
+                self.save_manifest(manifest)
+            if self.bm25_enabled and not self.bm25_index_path.exists():
+                self.build_lexical_index()
+            if self.chunk_graph_enabled and not self.chunk_graph_path.exists():
+                self.build_chunk_graph()
+            return
+        
+        console.print(
+            f"🔄 {len(changed_files)} novos/alterados, "
+            f"{len(removed_names)} removidos, "
+            f"{len(pdf_files) - len(changed_files)} inalterados\n"
+        )
+        
+        # Remove chunks e imagens antigos dos PDFs alterados/removidos
+        removed_ids = list(orphan_ids)
+        removed_page_ids = []
+        for name in removed_names + [pdf.name for pdf in changed_files]:
+            entry = manifest['files'].pop(name, None)
+            if entry:
+                removed_ids.extend(entry.get('chunk_ids', []))
+                removed_page_ids.extend(entry.get('page_ids', []))
+                self._remove_images(all_images_metadata, entry['source'])
+                parent_store.remove_source(entry['source'])
+        if self.dedup_index is not None:
+            self.dedup_index.remove_files(removed_names + [pdf.name for pdf in changed_files])
+            self.dedup_index.save(self.dedup_index_path)
+        
+        if removed_ids:
+            self.load_vectorstore().delete(ids=removed_ids)
+            console.print(f"[green]✓[/green] {len(removed_ids)} chunks obsoletos removidos\n")
+        if removed_page_ids:
+            self.load_page_vectorstore().delete(ids=removed_page_ids)
+        self.save_image_metadata(all_images_metadata)
+        self.save_manifest(manifest)
+        self.save_checkpoint(checkpoint)
         
-        all_documents = []
-        all_images_metadata = {}
+        self.stats = {'sources': set(), 'pages': 0, 'chunks': 0, 'chunks_with_images': 0, 'sections': {},
+                      'duplicates': 0, 'furniture_lines': 0}
         
-        # Processa cada PDF
+        # Processa cada PDF novo/alterado
+        failed_files = []
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -259,57 +881,114 @@ class AdvancedIndexer:
             console=console
         ) as progress:
             
-            task = progress.add_task("Processando PDFs...", total=len(pdf_files))
+            task = progress.add_task("Processando PDFs...", total=len(changed_files))
             
-            for pdf_file in pdf_files:
-                docs, images = self.processor.process_pdf(pdf_file)
-                all_documents.extend(docs)
-                all_images_metadata.update(self.processor.image_metadata)
-                progress.advance(task)
+            processed = self.iter_processed_pdfs(
+                changed_files,
+                on_file_done=lambda _: progress.advance(task),
+                file_hashes=current_hashes
+            )
+            for pdf_file, chunks, pages, file_parent_pages, image_metadata in self.iter_file_chunks(processed):
+                if chunks is None:
+                    # Fica fora do manifesto: a próxima execução tenta de novo
+                    failed_files.append(pdf_file.name)
+                    continue
+                
+                # Retomada: chunks já gravados por uma execução interrompida são pulados
+                file_checkpoint = checkpoint['files'].setdefault(
+                    pdf_file.name, {'sha256': current_hashes[pdf_file.name], 'done_ids': []}
+                )
+                done_ids = set(file_checkpoint['done_ids'])
+                if done_ids:
+                    console.print(f"  [cyan]↩️[/cyan]  {pdf_file.name}: retomando ({len(done_ids)} chunks já indexados)")
+                
+                def record_batch(batch_ids, file_checkpoint=file_checkpoint):
+                    file_checkpoint['done_ids'].extend(batch_ids)
+                    self.save_checkpoint(checkpoint)
+                
+                self.upsert_chunks(chunks, skip_ids=done_ids, on_batch_done=record_batch)
+                if pages:
+                    # Upsert idempotente (IDs = chave da página): retomadas só regravam
+                    self.load_page_vectorstore().add_documents(pages, ids=[page.metadata['page_key'] for page in pages])
+                console.print(f"  [green]✓[/green] {pdf_file.name}: {len(chunks)} chunks, {len(pages)} páginas indexadas")
+                
+                # Checkpoint: o PDF só entra no manifesto depois de persistido no banco
+                self.merge_image_metadata(all_images_metadata, image_metadata)
+                self.save_image_metadata(all_images_metadata)
+                parent_store.put_pages(pdf_file.stem, file_parent_pages)
+                if self.dedup_index is not None:
+                    self.dedup_index.save(self.dedup_index_path)
+                manifest['files'][pdf_file.name] = {
+                    'sha256': current_hashes[pdf_file.name],
+                    'source': pdf_file.stem,
+                    'chunk_ids': [chunk.metadata['chunk_id'] for chunk in chunks],
+                    'page_ids': [page.metadata['page_key'] for page in pages]
+                }
+                self.save_manifest(manifest)
+                del checkpoint['files'][pdf_file.name]
+                self.save_checkpoint(checkpoint)
+        parent_store.close()
         
-        # Salva metadata de imagens
-        with open("image_metadata.json", "w") as f:
-            json.dump(all_images_metadata, f, indent=2)
+        self._collect_garbage(all_images_metadata, current_hashes)
         
-        console.print(f"\n[green]✓[/green] Total: {len(all_documents)} documentos processados")
+        # Índice NumPy: compacta o log de escrita na matriz base (cold start rápido no chatbot)
+        for store in (self.vectorstore, self.page_vectorstore):
+            if isinstance(store, NumpyVectorStore):
+                store.persist()
         
-        # Cria chunks
-        chunks = self.create_chunks(all_documents)
+        if self.bm25_enabled:
+            self.build_lexical_index()
+        if self.chunk_graph_enabled:
+            self.build_chunk_graph()
         
-        # Cria embeddings e vectorstore
-        self.vectorstore = self.build_vectorstore(chunks)
+        console.print(f"\n[green]✓[/green] Banco vetorial atualizado em {self.persist_directory}")
+        if failed_files:
+            console.print(f"[red]✗[/red] {len(failed_files)} PDF(s) com erro, fora do manifesto "
+                          f"(serão tentados de novo na próxima execução): {', '.join(failed_files)}")
+        if isinstance(self.embeddings, BatchedEmbeddings):
+            console.print(f"[green]⚡[/green] {self.embeddings.stats_summary()}")
         
         console.print("\n" + "="*70)
         console.print("[bold green]✅ INDEXAÇÃO CONCLUÍDA COM SUCESSO![/bold green]")
         console.print("="*70 + "\n")
         
         # Estatísticas
-        self._print_statistics(all_documents, chunks, all_images_metadata)
+        self._print_statistics(self.stats, all_images_metadata)
+    
+    def _update_statistics(self, documents: List[Document], chunks: List[Document]):
+        """Acumula as estatísticas de um PDF (sem manter páginas e chunks em memória)"""
+        self.stats['sources'].update(doc.metadata['source'] for doc in documents)
+        self.stats['pages'] += len(documents)
+        self.stats['chunks'] += len(chunks)
+        self.stats['chunks_with_images'] += sum(1 for chunk in chunks if chunk.metadata.get('has_images'))
+        for doc in documents:
+            section = doc.metadata.get('section', 'unknown')
+            self.stats['sections'][section] = self.stats['sections'].get(section, 0) + 1
     
-    def _print_statistics(self, documents, chunks, images_metadata):
+    def _print_statistics(self, stats, images_metadata):
         """Imprime estatísticas da indexação"""
         console.print("[bold]📊 Estatísticas:[/bold]\n")
         
         # Documentos
-        doc_sources = set(doc.metadata['source'] for doc in documents)
-        console.print(f"  📄 Documentos únicos: {len(doc_sources)}")
-        console.print(f"  📃 Total de páginas: {len(documents)}")
-        console.print(f"  ✂️  Total de chunks: {len(chunks)}")
+        console.print(f"  📄 Documentos processados: {len(stats['sources'])}")
+        console.print(f"  📃 Total de páginas: {stats['pages']}")
+        console.print(f"  ✂️  Total de chunks: {stats['chunks']}")
+        if stats.get('duplicates') or stats.get('furniture_lines'):
+            before = stats['chunks'] + stats['duplicates']
+            console.print(
+                f"  🧹 Quase duplicados colapsados: {stats['duplicates']} de {before} chunks "
+                f"(índice {stats['duplicates'] / max(1, before):.1%} menor)"
+            )
+            console.print(f"  🧹 Linhas de cabeçalho/rodapé removidas: {stats['furniture_lines']}")
         
         # Imagens
-        console.print(f"  📷 Total de imagens: {len(images_metadata)}")
-        
-        chunks_with_images = sum(1 for chunk in chunks if chunk.metadata.get('has_images'))
-        console.print(f"  🖼️  Chunks com imagens: {chunks_with_images}")
+        total_references = sum(len(info.get('references', [info])) for info in images_metadata.values())
+        console.print(f"  📷 Total de imagens: {len(images_metadata)} arquivos ({total_references} ocorrências)")
+        console.print(f"  🖼️  Chunks com imagens: {stats['chunks_with_images']}")
         
         # Seções
-        sections = {}
-        for doc in documents:
-            section = doc.metadata.get('section', 'unknown')
-            sections[section] = sections.get(section, 0) + 1
-        
         console.print(f"\n  📑 Páginas por seção:")
-        for section, count in sorted(sections.items(), key=lambda x: x[1], reverse=True):
+        for section, count in sorted(stats['sections'].items(), key=lambda x: x[1], reverse=True):
             console.print(f"     • {section}: {count}")
         
         console.print()
@@ -323,12 +1002,23 @@ def main():
         console.print("[red]❌ GOOGLE_API_KEY não configurada no config.py![/red]")
         return
     
+    parser = argparse.ArgumentParser(description="Indexador avançado da documentação Camunda")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignora o manifesto e reindexa todos os PDFs do zero")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos para extrair os PDFs em paralelo (0 = todos os núcleos)")
+    args = parser.parse_args()
+    
+    config = {}
+    if args.workers is not None:
+        config['workers'] = args.workers
+    
     # Cria indexador
-    indexer = AdvancedIndexer(GOOGLE_API_KEY)
+    indexer = AdvancedIndexer(GOOGLE_API_KEY, config=config)
     
     # Executa indexação
     try:
-        indexer.index_all_documents()
+        indexer.index_all_documents(full=args.full)
         
         console.print("[bold green]🎉 Pronto! Execute o chatbot avançado:[/bold green]")
         console.print("[cyan]   streamlit run chatbot_advanced.py[/cyan]\n")
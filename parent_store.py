@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Parent Store
+============
+Texto integral das páginas (chave da página → texto) em SQLite, usado para expandir
+os chunks (filhos) no prompt. O indexador grava as páginas de cada PDF uma única vez,
+numa transação, e o chatbot lê só as páginas dos chunks selecionados — nenhum dos
+dois mantém o corpus inteiro em memória
+"""
+
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+
+class ParentStore:
+    """Páginas indexadas por `page_key`, agrupadas por documento (`source`)
+
+    Usa o journal padrão do SQLite (sem WAL): depois de cada commit o arquivo está
+    completo sozinho, então o snapshot do índice pode copiá-lo como um arquivo comum.
+    """
+
+    def __init__(self, path: str = "parent_store.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                   page_key TEXT PRIMARY KEY,
+                   source TEXT NOT NULL,
+                   text TEXT NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_source ON pages (source)")
+        self._conn.commit()
+
+    def put_pages(self, source: str, pages: Dict[str, str]):
+        """Substitui as páginas de um documento (uma transação por PDF)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (page_key, source, text) VALUES (?, ?, ?)",
+                [(page_key, source, text) for page_key, text in pages.items()]
+            )
+
+    def remove_source(self, source: str):
+        """Remove as páginas de um documento"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE source = ?", (source,))
+
+    def get_many(self, page_keys: Iterable[str]) -> Dict[str, str]:
+        """Texto das páginas pedidas (as que não existem ficam de fora)"""
+        unique_keys = [key for key in dict.fromkeys(page_keys) if key]
+        found = {}
+        with self._lock:
+            # Consulta em blocos (limite de parâmetros do SQLite)
+            for i in range(0, len(unique_keys), 500):
+                block = unique_keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT page_key, text FROM pages WHERE page_key IN ({','.join('?' * len(block))})",
+                    block
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def get(self, page_key: str) -> Optional[str]:
+        return self.get_many([page_key]).get(page_key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Filtros de Metadata
+===================
+Monta cláusulas `where` (formato Chroma, também aceito pelo índice NumPy) a partir
+de filtros por documento, seção e presença de imagens, e infere o documento alvo
+de uma pergunta com um classificador simples por palavras-chave
+"""
+
+from typing import Dict, List, Optional, Union
+
+
+# Palavras-chave que direcionam a pergunta para um documento (nome do PDF sem extensão)
+DOCUMENT_ROUTES = {
+    'Data Migrator': ['data migrator', 'migrador de dados', 'migração de dados', 'migrar dados',
+                      'history migration', 'migração do histórico', 'runtime migration'],
+    'Code Conversion': ['code conversion', 'conversão de código', 'converter código', 'javadelegate',
+                        'java delegate', 'job worker', 'executionlistener', 'execution listener'],
+    'Migration tooling': ['migration tooling', 'migration analyzer', 'diagram converter',
+                          'ferramentas de migração', 'analisador de migração'],
+    'Migration Journey': ['migration journey', 'jornada de migração', 'etapas da migração',
+                          'fases da migração'],
+    'Conceptual differences': ['conceptual differences', 'diferenças conceituais', 'diferença conceitual'],
+    'Migration-ready solutions': ['migration-ready', 'migration ready', 'pronta para migração',
+                                  'prontas para migração', 'pronto para migração'],
+}
+
+
+def build_where(documents: Union[str, List[str]] = None, section: str = None,
+                has_images: bool = None) -> Optional[Dict]:
+    """Cláusula `where` para o banco vetorial; None se não houver filtro"""
+    conditions = []
+    if documents:
+        documents = [documents] if isinstance(documents, str) else list(documents)
+        conditions.append({'source': documents[0]} if len(documents) == 1 else {'source': {'$in': documents}})
+    if section:
+        conditions.append({'section': section})
+    if has_images is not None:
+        conditions.append({'has_images': bool(has_images)})
+    return combine_where(*conditions)
+
+
+def combine_where(*clauses: Optional[Dict]) -> Optional[Dict]:
+    """Junta cláusulas `where` com $and, ignorando as vazias (Chroma exige $and explícito
+    quando há mais de um campo)"""
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def infer_filters(question: str, routes: Dict[str, List[str]] = None) -> Dict:
+    """Classificador por palavras-chave: documentos citados na pergunta (vazio = sem filtro)"""
+    text = question.lower()
+    documents = [
+        document for document, keywords in (routes or DOCUMENT_ROUTES).items()
+        if any(keyword in text for keyword in keywords)
+    ]
+    return {'documents': documents} if documents else {}
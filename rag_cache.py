@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Caches do Chatbot
+=================
+Caches em memória, thread-safe e com limite de tamanho (LRU), compartilhados por
+todas as sessões do engine: embeddings das perguntas (na frente do cache SQLite),
+respostas de perguntas equivalentes (busca por similaridade do embedding) e
+contadores de acerto para medir quanto de latência cada um economiza
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Pergunta normalizada para chave de cache (caixa e espaços não importam)"""
+    return " ".join(text.casefold().split())
+
+
+class LRUCache:
+    """Dicionário limitado: ao passar de `max_size`, descarta o item usado há mais tempo"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max(1, max_size)
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Valor em cache (e marca como usado recentemente); `default` se não houver"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def hit_rate(self) -> float:
+        """Fração de consultas atendidas pelo cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'size': len(self._items),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+        }
+
+
+class SemanticAnswerCache:
+    """Respostas já geradas, encontradas pelo embedding da pergunta (cosseno ≥ threshold)
+
+    "O que é Zeebe?" e "o que é o zeebe" caem na mesma entrada. Entradas expiram após
+    `ttl_seconds`, o excedente de `max_size` sai por LRU e tudo é descartado quando a
+    versão do índice muda (respostas citam chunks que podem não existir mais).
+    `scope` separa respostas de buscas com filtros diferentes.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_size: int = 500):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max(1, max_size)
+        self.version: Optional[str] = None
+        # chave → (vetor normalizado, scope, resposta, criado em)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def set_version(self, version: Optional[str]):
+        """Versão atual do índice; se mudou, esvazia o cache"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def lookup(self, vector: List[float], scope: Hashable = None) -> Optional[Dict]:
+        """Resposta da pergunta mais parecida (se acima do threshold e não expirada)"""
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]:
+                del self._entries[key]
+
+            candidates = [key for key, entry in self._entries.items()
+                          if entry[1] == scope and len(entry[0]) == len(query)]
+            if candidates:
+                scores = np.stack([self._entries[key][0] for key in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][2]
+            self.misses += 1
+            return None
+
+    def store(self, vector: List[float], answer: Dict, scope: Hashable = None, version: Optional[str] = None):
+        """Guarda a resposta; descartada se o índice mudou enquanto ela era gerada"""
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[self._next_key] = (self._normalize(vector), scope, answer, time.time())
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self) -> float:
+        """Fração de perguntas respondidas pelo cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'index_version': self.version,
+        }
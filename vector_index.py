@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Índice Vetorial Local (NumPy)
+=============================
+Alternativa leve ao ChromaDB: uma matriz float32/float16 memory-mapped com os
+embeddings normalizados, uma tabela de metadata dos chunks e busca top-k por
+similaridade de cosseno vetorizada (força bruta). Mesma interface usada do
+Chroma do LangChain (add_documents, delete, get, similarity_search_with_score).
+Opcionalmente mantém em RAM só códigos quantizados (int8 ou binários) e reordena
+os melhores candidatos com os vetores em precisão total
+"""
+
+import os
+import json
+import shutil
+import threading
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+INDEX_VERSION = 1
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Número de bits 1 em cada byte (distância de Hamming dos códigos binários)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Linhas por bloco nas varreduras (limita a memória temporária)
+_BLOCK_ROWS = 16384
+
+# Blocos menores para os códigos int8: a conversão para float32 cabe no cache da CPU
+_CODE_BLOCK_ROWS = 512
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantização escalar por vetor: int8 + escala float32 (≈ 4× menos memória)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None] * 127).astype(np.int8)
+    return codes, (scales / 127).astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Códigos binários de sinal, empacotados em bits (32× menos memória que float32)"""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def _match_condition(values: np.ndarray, condition) -> np.ndarray:
+    """Aplica uma condição do `where` (estilo Chroma) a uma coluna de metadata"""
+    if not isinstance(condition, dict):
+        condition = {'$eq': condition}
+
+    mask = np.ones(len(values), dtype=bool)
+    for operator, operand in condition.items():
+        if operator == '$eq':
+            mask &= values == operand
+        elif operator == '$ne':
+            mask &= values != operand
+        elif operator in ('$in', '$nin'):
+            allowed = set(operand)
+            found = np.fromiter((v in allowed for v in values), dtype=bool, count=len(values))
+            mask &= found if operator == '$in' else ~found
+        elif operator in ('$gt', '$gte', '$lt', '$lte'):
+            compare = {
+                '$gt': lambda v: v is not None and v > operand,
+                '$gte': lambda v: v is not None and v >= operand,
+                '$lt': lambda v: v is not None and v < operand,
+                '$lte': lambda v: v is not None and v <= operand,
+            }[operator]
+            mask &= np.fromiter((compare(v) for v in values), dtype=bool, count=len(values))
+        else:
+            raise ValueError(f"Operador de filtro não suportado: {operator}")
+    return mask
+
+
+class NumpyVectorStore:
+    """Vector store em processo: matriz NumPy + metadata, persistida em disco
+
+    Layout do diretório:
+      - index.json        : cabeçalho (versão, dimensão, dtype, geração atual)
+      - vectors.<g>.npy   : matriz (n × dim) de embeddings normalizados (aberta com mmap)
+      - chunks.<g>.json   : ids, textos e metadatas (colunar, na mesma ordem da matriz)
+      - wal.jsonl         : log de upserts/deletes desde a última compactação
+
+    Cada escrita (add/delete) é anexada ao WAL antes de retornar, então um lote
+    gravado é durável; `persist()` compacta o WAL em uma nova geração da base e
+    só então troca o cabeçalho (atômico), então uma interrupção nunca mistura gerações.
+    Os scores retornados estão na escala do Chroma (espaço "l2", o padrão): distância
+    euclidiana ao quadrado entre os vetores normalizados, 2 - 2·cos (0 a 4; menor =
+    mais similar), então limiares e exibição valem igual nos dois backends.
+    """
+
+    def __init__(self, persist_directory: str = "./numpy_index", embedding_function: Embeddings = None,
+                 collection_name: str = "camunda_migration", dtype: str = "float32",
+                 compact_every: int = 5000, quantization: str = "none", rescore_candidates: int = 200):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization inválida: {quantization} (use {', '.join(QUANTIZATION_MODES)})")
+        self.persist_directory = Path(persist_directory)
+        self.embedding_function = embedding_function
+        self.collection_name = collection_name
+        self.dtype = np.dtype(dtype)
+        self.compact_every = compact_every
+        
+        # Busca aproximada nos códigos quantizados + rescoring em precisão total
+        self.quantization = quantization
+        self.rescore_candidates = rescore_candidates
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._vectors: Optional[np.ndarray] = None
+        # Buffer em RAM com folga para novas linhas; `_vectors` é uma view dele até o próximo persist()
+        self._buffer: Optional[np.ndarray] = None
+        self._row_by_id: Dict[str, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._postings: Dict[str, Dict] = {}
+        self._wal_entries = 0
+        self._generation = 0
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    @property
+    def _header_path(self) -> Path:
+        return self.persist_directory / "index.json"
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.persist_directory / f"vectors.{generation}.npy"
+
+    def _chunks_path(self, generation: int) -> Path:
+        return self.persist_directory / f"chunks.{generation}.json"
+
+    def _codes_path(self, generation: int, quantization: str) -> Path:
+        return self.persist_directory / f"codes_{quantization}.{generation}.npy"
+
+    def _scales_path(self, generation: int) -> Path:
+        return self.persist_directory / f"scales_int8.{generation}.npy"
+
+    @property
+    def _wal_path(self) -> Path:
+        return self.persist_directory / "wal.jsonl"
+
+    def _load(self):
+        """Abre o índice: matriz via mmap (cold start quase instantâneo) + replay do WAL"""
+        if self._header_path.exists():
+            with open(self._header_path, "r") as f:
+                header = json.load(f)
+            if header.get('version') != INDEX_VERSION:
+                raise ValueError(f"Versão de índice incompatível: {header.get('version')}")
+            self.dtype = np.dtype(header['dtype'])
+            self._generation = header['generation']
+
+            with open(self._chunks_path(self._generation), "r") as f:
+                chunks = json.load(f)
+            self._ids = chunks['ids']
+            self._documents = chunks['documents']
+            self._metadatas = chunks['metadatas']
+            self._vectors = np.load(self._vectors_path(self._generation), mmap_mode='r')
+            self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+            
+            # Códigos quantizados ficam inteiros em RAM (são o conjunto "quente" da busca)
+            codes_path = self._codes_path(self._generation, self.quantization)
+            if self.quantization != "none" and codes_path.exists():
+                self._codes = np.load(codes_path)
+                if self.quantization == "int8":
+                    self._scales = np.load(self._scales_path(self._generation))
+
+        if self._wal_path.exists():
+            with open(self._wal_path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Última linha truncada por uma interrupção
+                    self._apply(entry)
+                    self._wal_entries += 1
+
+    def _append_wal(self, entry: Dict):
+        """Registra a operação no WAL (fsync) antes de aplicá-la em memória"""
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        with open(self._wal_path, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply(entry)
+        self._wal_entries += 1
+        if self._wal_entries >= self.compact_every:
+            self.persist()
+
+    def persist(self):
+        """Compacta: grava matriz e metadata base (atomicamente) e zera o WAL"""
+        with self._lock:
+            self.persist_directory.mkdir(parents=True, exist_ok=True)
+            vectors = self._vectors if self._vectors is not None else np.zeros((0, 0), dtype=self.dtype)
+            old_generation, generation = self._generation, self._generation + 1
+
+            np.save(self._vectors_path(generation), np.ascontiguousarray(vectors, dtype=self.dtype))
+            if self.quantization != "none":
+                self._ensure_codes()
+                np.save(self._codes_path(generation, self.quantization), self._codes)
+                if self.quantization == "int8":
+                    np.save(self._scales_path(generation), self._scales)
+            with open(self._chunks_path(generation), "w") as f:
+                json.dump({'ids': self._ids, 'documents': self._documents, 'metadatas': self._metadatas},
+                          f, ensure_ascii=False)
+            tmp_header = self.persist_directory / "index.json.tmp"
+            with open(tmp_header, "w") as f:
+                json.dump({
+                    'version': INDEX_VERSION,
+                    'collection_name': self.collection_name,
+                    'generation': generation,
+                    'dtype': self.dtype.name,
+                    'dimension': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+                    'count': len(self._ids),
+                }, f, indent=2)
+
+            # Troca de geração atômica; o WAL já aplicado é descartado em seguida
+            # (se a interrupção vier antes, o replay dele é idempotente)
+            os.replace(tmp_header, self._header_path)
+            self._generation = generation
+            self._wal_path.unlink(missing_ok=True)
+            self._wal_entries = 0
+            self._vectors_path(old_generation).unlink(missing_ok=True)
+            self._chunks_path(old_generation).unlink(missing_ok=True)
+            self._scales_path(old_generation).unlink(missing_ok=True)
+            for mode in QUANTIZATION_MODES[1:]:
+                self._codes_path(old_generation, mode).unlink(missing_ok=True)
+
+            # Reabre com mmap: a memória residente volta a ser só o que a busca tocar
+            self._vectors = np.load(self._vectors_path(generation), mmap_mode='r')
+            self._buffer = None
+
+    def delete_collection(self):
+        """Apaga o índice inteiro (disco e memória)"""
+        with self._lock:
+            shutil.rmtree(self.persist_directory, ignore_errors=True)
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._vectors = None
+            self._buffer = None
+            self._codes = self._scales = None
+            self._row_by_id = {}
+            self._columns = {}
+            self._postings = {}
+            self._wal_entries = 0
+            self._generation = 0
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra: int, dimension: int):
+        """Garante que `_vectors` está no buffer próprio (fora do mmap) com espaço para mais
+        `extra` linhas. A capacidade dobra ao encher: inserir N linhas em lotes custa O(N)
+        cópias no total, não uma cópia da matriz inteira por lote."""
+        count = len(self._ids)
+        if self._buffer is not None and count + extra <= len(self._buffer):
+            return
+        buffer = np.empty((max(count + extra, 2 * count, 1024), dimension), dtype=self.dtype)
+        if count:
+            buffer[:count] = self._vectors
+        self._buffer = buffer
+        self._vectors = buffer[:count]
+
+    def _apply(self, entry: Dict):
+        """Aplica uma operação do WAL ao estado em memória"""
+        self._columns = {}
+        self._postings = {}
+        self._codes = self._scales = None  # Recalculados na próxima busca
+        if entry['op'] == 'delete':
+            rows = [self._row_by_id[chunk_id] for chunk_id in entry['ids'] if chunk_id in self._row_by_id]
+            if not rows:
+                return
+            keep = np.ones(len(self._ids), dtype=bool)
+            keep[rows] = False
+            self._reserve(0, self._vectors.shape[1])
+            remaining = int(keep.sum())
+            self._buffer[:remaining] = self._vectors[keep]
+            self._vectors = self._buffer[:remaining]
+            self._ids = [v for v, k in zip(self._ids, keep) if k]
+            self._documents = [v for v, k in zip(self._documents, keep) if k]
+            self._metadatas = [v for v, k in zip(self._metadatas, keep) if k]
+            self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+            return
+
+        # upsert
+        if not entry['ids']:
+            return
+        vectors = self._normalize(np.asarray(entry['vectors'], dtype=np.float32)).astype(self.dtype)
+        existing = [(i, self._row_by_id[chunk_id]) for i, chunk_id in enumerate(entry['ids'])
+                    if chunk_id in self._row_by_id]
+        existing_positions = {i for i, _ in existing}
+        new_positions = [i for i in range(len(entry['ids'])) if i not in existing_positions]
+        self._reserve(len(new_positions), vectors.shape[1])  # Sai do mmap (somente leitura)
+
+        for i, row in existing:
+            self._vectors[row] = vectors[i]
+            self._documents[row] = entry['documents'][i]
+            self._metadatas[row] = entry['metadatas'][i]
+
+        if new_positions:
+            count = len(self._ids)
+            self._buffer[count:count + len(new_positions)] = vectors[new_positions]
+            self._vectors = self._buffer[:count + len(new_positions)]
+            for i in new_positions:
+                self._row_by_id[entry['ids'][i]] = len(self._ids)
+                self._ids.append(entry['ids'][i])
+                self._documents.append(entry['documents'][i])
+                self._metadatas.append(entry['metadatas'][i])
+
+    def add_texts(self, texts: Iterable[str], metadatas: List[Dict] = None, ids: List[str] = None,
+                  embeddings: List[List[float]] = None) -> List[str]:
+        """Insere ou substitui textos (embeddings calculados pelo embedding_function se não vierem prontos)"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [metadata.get('chunk_id') or f"chunk_{len(self._ids) + i}"
+                      for i, metadata in enumerate(metadatas)]
+        if embeddings is None:
+            embeddings = self.embedding_function.embed_documents(texts)
+
+        with self._lock:
+            self._append_wal({
+                'op': 'upsert',
+                'ids': list(ids),
+                'documents': texts,
+                'metadatas': metadatas,
+                'vectors': [list(map(float, vector)) for vector in embeddings],
+            })
+        return list(ids)
+
+    def add_documents(self, documents: List[Document], ids: List[str] = None) -> List[str]:
+        """Insere ou substitui documentos LangChain"""
+        return self.add_texts(
+            [doc.page_content for doc in documents],
+            metadatas=[dict(doc.metadata) for doc in documents],
+            ids=ids
+        )
+
+    def delete(self, ids: List[str] = None):
+        """Remove chunks pelo ID"""
+        if not ids:
+            return
+        with self._lock:
+            self._append_wal({'op': 'delete', 'ids': list(ids)})
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _column(self, field: str) -> np.ndarray:
+        """Coluna de metadata como array (cacheada até a próxima escrita)"""
+        if field not in self._columns:
+            column = np.empty(len(self._metadatas), dtype=object)
+            column[:] = [metadata.get(field) for metadata in self._metadatas]
+            self._columns[field] = column
+        return self._columns[field]
+
+    def _value_rows(self, field: str) -> Dict:
+        """Índice invertido valor → linhas (ordenadas) de um campo de metadata
+        (montado uma vez e cacheado até a próxima escrita)"""
+        if field not in self._postings:
+            postings = {}
+            for row, metadata in enumerate(self._metadatas):
+                postings.setdefault(metadata.get(field), []).append(row)
+            self._postings[field] = {value: np.array(rows, dtype=np.int64) for value, rows in postings.items()}
+        return self._postings[field]
+
+    def _where_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Linhas que satisfazem um `where` feito só de igualdades/$in (unidos por $and)
+        
+        A cláusula mais seletiva vem do índice invertido e as demais são conferidas só
+        nessas linhas: o custo é proporcional às linhas encontradas, não ao corpus.
+        None se o filtro usar outros operadores (cai na máscara).
+        """
+        if not where:
+            return None
+        clauses = where['$and'] if list(where) == ['$and'] else [{key: value} for key, value in where.items()]
+        specs = []
+        for clause in clauses:
+            if not isinstance(clause, dict) or len(clause) != 1:
+                return None
+            (field, condition), = clause.items()
+            if field.startswith('$'):
+                return None
+            if not isinstance(condition, dict):
+                values = [condition]
+            elif list(condition) == ['$eq']:
+                values = [condition['$eq']]
+            elif list(condition) == ['$in']:
+                values = list(condition['$in'])
+            else:
+                return None
+            try:
+                postings = self._value_rows(field)
+                found = [postings[value] for value in set(values) if value in postings]
+            except TypeError:
+                return None  # Valor não hasheável
+            specs.append((sum(len(rows) for rows in found), field, set(values), found))
+
+        _, _, _, found = min(specs, key=lambda spec: spec[0])
+        rows = np.sort(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+        for _, field, values, _ in sorted(specs, key=lambda spec: spec[0])[1:]:
+            if not len(rows):
+                break
+            column = self._column(field)[rows]
+            rows = rows[np.fromiter((value in values for value in column), dtype=bool, count=len(rows))]
+        return rows
+
+    def _where_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Converte um filtro `where` (subconjunto da sintaxe do Chroma) em máscara booleana"""
+        if not where:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, condition in where.items():
+            if key == '$and':
+                for sub in condition:
+                    mask &= self._where_mask(sub)
+            elif key == '$or':
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for sub in condition:
+                    any_mask |= self._where_mask(sub)
+                mask &= any_mask
+            else:
+                mask &= _match_condition(self._column(key), condition)
+        return mask
+
+    def get(self, ids: List[str] = None, where: Dict = None, limit: int = None, offset: int = None,
+            include: List[str] = None) -> Dict:
+        """Busca por ID/filtro, no formato do `Chroma.get` (ids, documents, metadatas[, embeddings])"""
+        include = include if include is not None else ['documents', 'metadatas']
+        with self._lock:
+            matched = self._where_rows(where)
+            if ids is not None:
+                rows = [self._row_by_id[chunk_id] for chunk_id in ids if chunk_id in self._row_by_id]
+                if matched is not None:
+                    allowed = set(matched.tolist())
+                    rows = [row for row in rows if row in allowed]
+            elif matched is not None:
+                rows = matched.tolist()
+            else:
+                rows = list(range(len(self._ids)))
+            if where and matched is None:
+                mask = self._where_mask(where)
+                rows = [row for row in rows if mask[row]]
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+
+            result = {'ids': [self._ids[row] for row in rows]}
+            if 'documents' in include:
+                result['documents'] = [self._documents[row] for row in rows]
+            if 'metadatas' in include:
+                result['metadatas'] = [self._metadatas[row] for row in rows]
+            if 'embeddings' in include:
+                result['embeddings'] = (np.asarray(self._vectors[rows], dtype=np.float32)
+                                        if rows else np.zeros((0, 0), dtype=np.float32))
+            return result
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Similaridade de cosseno da consulta contra a matriz (em blocos, sempre em float32)"""
+        vectors = self._vectors if rows is None else self._vectors[rows]
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        return np.concatenate([
+            np.asarray(vectors[i:i + _BLOCK_ROWS], dtype=np.float32) @ query
+            for i in range(0, len(vectors), _BLOCK_ROWS)
+        ])
+
+    def _ensure_codes(self):
+        """Gera os códigos quantizados a partir dos vetores (após escritas ou na primeira busca)"""
+        if self._codes is not None or self._vectors is None:
+            return
+        codes, scales = [], []
+        for i in range(0, len(self._vectors), _BLOCK_ROWS):
+            block = np.asarray(self._vectors[i:i + _BLOCK_ROWS], dtype=np.float32)
+            if self.quantization == "int8":
+                block_codes, block_scales = quantize_int8(block)
+                codes.append(block_codes)
+                scales.append(block_scales)
+            else:
+                codes.append(quantize_binary(block))
+        self._codes = np.concatenate(codes) if codes else np.zeros((0, 0), dtype=np.int8)
+        self._scales = np.concatenate(scales) if scales else None
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Scores aproximados (maior = mais similar) usando só os códigos quantizados"""
+        self._ensure_codes()
+        codes = self._codes if rows is None else self._codes[rows]
+        results = []
+        if self.quantization == "int8":
+            scales = self._scales if rows is None else self._scales[rows]
+            for i in range(0, len(codes), _CODE_BLOCK_ROWS):
+                block = codes[i:i + _CODE_BLOCK_ROWS].astype(np.float32) @ query
+                results.append(block * scales[i:i + _CODE_BLOCK_ROWS])
+        else:
+            query_bits = quantize_binary(query[None, :])[0]
+            for i in range(0, len(codes), _BLOCK_ROWS):
+                hamming = _POPCOUNT[np.bitwise_xor(codes[i:i + _BLOCK_ROWS], query_bits)].sum(axis=1)
+                results.append(-hamming.astype(np.float32))
+        return np.concatenate(results)
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Bytes da matriz em precisão total e dos códigos quantizados (o que precisa ficar em RAM)"""
+        vectors_bytes = int(self._vectors.nbytes) if self._vectors is not None else 0
+        if self.quantization == "none":
+            return {'vectors': vectors_bytes, 'codes': 0, 'hot': vectors_bytes}
+        self._ensure_codes()
+        codes_bytes = int(self._codes.nbytes) + (int(self._scales.nbytes) if self._scales is not None else 0)
+        return {'vectors': vectors_bytes, 'codes': codes_bytes, 'hot': codes_bytes}
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Dict = None) -> List[Tuple[Document, float]]:
+        """Top-k por cosseno a partir de um embedding pronto
+        
+        Com quantização, a primeira passada usa só os códigos em RAM e apenas os
+        `rescore_candidates` melhores são relidos (mmap) e reordenados em float32.
+        """
+        with self._lock:
+            if not self._ids:
+                return []
+            query = self._normalize(np.asarray([embedding], dtype=np.float32))[0]
+
+            # Igualdades/$in (ex.: page_key da busca em dois estágios) vêm do índice invertido:
+            # só as linhas filtradas são pontuadas
+            rows = self._where_rows(filter)
+            if rows is None and filter:
+                rows = np.flatnonzero(self._where_mask(filter))
+            if rows is not None and len(rows) == 0:
+                return []
+
+            total = len(rows) if rows is not None else len(self._ids)
+            shortlist = max(k, self.rescore_candidates)
+            if self.quantization != "none" and total > shortlist:
+                approximate = self._approximate_scores(query, rows)
+                positions = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+                rows = np.sort(positions if rows is None else rows[positions])  # Leitura sequencial no mmap
+
+            scores = self._scores(query, rows)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            for position in top:
+                row = int(rows[position]) if rows is not None else int(position)
+                results.append((
+                    Document(page_content=self._documents[row], metadata=self._metadatas[row]),
+                    float(2.0 - 2.0 * scores[position])  # L2² entre vetores unitários (escala do Chroma)
+                ))
+            return results
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          filter: Dict = None) -> List[Tuple[Document, float]]:
+        """Mesmo nome e retorno (distâncias) do Chroma do LangChain"""
+        return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Dict = None) -> List[Tuple[Document, float]]:
+        """Top-k por cosseno para uma consulta em texto (distância L2², como no Chroma: menor = mais similar)"""
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Dict = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+
+def load_vector_store(config: Dict, embedding_function: Embeddings, level: str = "chunk"):
+    """Abre o backend vetorial configurado ('chroma' ou 'numpy') com a mesma interface
+    
+    `level="page"` abre a coleção de páginas (estágio grosso da busca em dois estágios).
+    """
+    backend = config.get('vector_backend', "chroma")
+    collection_name = config.get('collection_name', "camunda_migration")
+    if level == "page":
+        collection_name = config.get('page_collection_name', f"{collection_name}_pages")
+
+    if backend == "numpy":
+        return NumpyVectorStore(
+            persist_directory=str(vector_store_path(config, level)),
+            embedding_function=embedding_function,
+            collection_name=collection_name,
+            dtype=config.get('vector_dtype', "float32"),
+            quantization=config.get('vector_quantization', "none"),
+            rescore_candidates=config.get('rescore_candidates', 200)
+        )
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(
+            persist_directory=str(vector_store_path(config, level)),
+            embedding_function=embedding_function,
+            collection_name=collection_name
+        )
+    raise ValueError(f"vector_backend inválido: {backend} (use 'chroma' ou 'numpy')")
+
+
+def vector_store_path(config: Dict, level: str = "chunk") -> Path:
+    """Diretório onde o backend configurado persiste o índice (Chroma guarda as duas coleções juntas)"""
+    if config.get('vector_backend', "chroma") == "numpy":
+        directory = Path(config.get('numpy_index_dir', "./numpy_index"))
+        return directory.with_name(f"{directory.name}_pages") if level == "page" else directory
+    return Path(config.get('persist_directory', "./chroma_db"))